@@ -0,0 +1,166 @@
+"""
+Online ledger backups using SQLite's backup API.
+
+Pages are copied in small steps with a short sleep in between, so other
+connections (the TUI included) can keep reading and committing while a
+backup runs on a worker thread. The cold files of archived years are
+copied too, into backups/archive/, whenever they changed since their copy.
+"""
+
+from datetime import datetime
+import glob
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def change_marker(db_path):
+    """Cheap fingerprint of a database file's committed state.
+
+    Bytes 24-27 of the SQLite header are the file change counter, bumped on
+    every committed write transaction; size and mtime catch everything else.
+    """
+    st = os.stat(db_path)
+    with open(db_path, "rb") as f:
+        f.seek(24)
+        counter = f.read(4)
+    return counter, st.st_size, st.st_mtime_ns
+
+
+class BackupManager:
+    """Rotating online backups of one ledger file"""
+
+    def __init__(self, db_path, backup_dir=None, keep=7, pages=64, sleep=0.005, archives=None):
+        self.db_path = db_path
+        # callable returning the ledger's cold archive files (Database.archive_paths)
+        self.archives = archives
+        self.backup_dir = backup_dir or os.path.join(os.path.dirname(db_path), "backups")
+        self.stem = os.path.splitext(os.path.basename(db_path))[0]
+        # budget-<timestamp>.db only, so the default ledger never rotates budget-household-* away
+        self._name_re = re.compile(rf"^{re.escape(self.stem)}-\d{{8}}-\d{{6}}\.db$")
+        self.keep = keep
+        self.pages = pages
+        self.sleep = sleep
+        self._last_marker = None
+        self._lock = threading.Lock()
+        self._timer = None
+        self._stopped = True
+
+    def list_backups(self):
+        """Backup files of this ledger, newest first"""
+        paths = glob.glob(os.path.join(self.backup_dir, f"{self.stem}-*.db"))
+        return sorted((p for p in paths if self._name_re.match(os.path.basename(p))), reverse=True)
+
+    def has_changed(self):
+        """Whether the ledger changed since the last backup"""
+        if self._last_marker is None:
+            backups = self.list_backups()
+            # first check in this process: trust the newest backup if it is newer than the ledger
+            return not backups or os.path.getmtime(backups[0]) < os.path.getmtime(self.db_path)
+        return change_marker(self.db_path) != self._last_marker
+
+    def backup(self, force=False):
+        """Copy the ledger into a new rotated backup file.
+
+        Returns a dict with path, pages, archives (cold files copied) and
+        duration, or None when the ledger is unchanged (unless `force`) or
+        another backup is already running.
+        """
+        if not os.path.exists(self.db_path):
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            if not force and not self.has_changed():
+                return None
+            marker = change_marker(self.db_path)
+            os.makedirs(self.backup_dir, exist_ok=True)
+            path = os.path.join(self.backup_dir, f"{self.stem}-{datetime.now():%Y%m%d-%H%M%S}.db")
+            partial = path + ".part"
+
+            started = time.perf_counter()
+            pages = self._copy(self.db_path, partial)
+            os.replace(partial, path)
+            archives = self._backup_archives()
+            duration = time.perf_counter() - started
+
+            self._last_marker = marker
+            self._rotate()
+            logger.info("Backed up %s to %s: %d pages and %d archive file(s) in %.3fs",
+                        self.db_path, path, pages, archives, duration)
+            return {"path": path, "pages": pages, "archives": archives, "duration": duration}
+        finally:
+            self._lock.release()
+
+    def _copy(self, source, target):
+        """Step-wise online copy of one database file; returns its page count"""
+        pages = 0
+
+        def progress(status, remaining, total):
+            nonlocal pages
+            pages = total
+
+        # read-only, so a missing source fails instead of being created empty
+        src = sqlite3.connect(f"file:{os.path.abspath(source)}?mode=ro", uri=True)
+        dst = sqlite3.connect(target)
+        try:
+            src.backup(dst, pages=self.pages, progress=progress, sleep=self.sleep)
+        finally:
+            dst.close()
+            src.close()
+        return pages
+
+    def _backup_archives(self):
+        """Copy the cold files changed since their last copy; they only change on `archive`"""
+        copied = 0
+        archive_dir = os.path.join(self.backup_dir, "archive")
+        for source in self.archives() if self.archives else []:
+            target = os.path.join(archive_dir, os.path.basename(source))
+            if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(source):
+                continue
+            os.makedirs(archive_dir, exist_ok=True)
+            self._copy(source, target + ".part")
+            os.replace(target + ".part", target)
+            copied += 1
+        return copied
+
+    def _rotate(self):
+        for old in self.list_backups()[self.keep:]:
+            os.remove(old)
+
+    # ─────────────────────────────
+    # PERIODIC BACKUPS
+    # ─────────────────────────────
+    def start_periodic(self, interval, on_done=None):
+        """Back up every `interval` seconds on a daemon thread; `on_done` gets each result"""
+        self._stopped = False
+
+        def tick():
+            try:
+                result = self.backup()
+                if result and on_done:
+                    on_done(result)
+            except Exception:
+                logger.exception("Periodic backup of %s failed", self.db_path)
+            self._schedule(interval, tick)
+
+        self._schedule(interval, tick)
+
+    def _schedule(self, interval, tick):
+        if self._stopped:
+            return
+        self._timer = threading.Timer(interval, tick)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop(self):
+        """Stop periodic backups"""
+        self._stopped = True
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Requests per second of the JSON API (server.py) on a synthetic ledger.
+
+Starts the server in a child process and hits it from keep-alive asyncio
+clients with a mix of month, category and transaction-page URLs, in three
+phases: cache disabled, cache warm, and conditional requests that send the
+ETag back and get 304s.
+
+    python benchmarks/api_load.py --rows 200000 --clients 16 --seconds 5
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import Database  # noqa: E402
+
+CATEGORIES = ["Food", "Transport", "Housing", "Entertainment", "Kids", "Healthcare", "Shopping", "Other"]
+
+
+def build_ledger(path, rows):
+    rng = random.Random(42)
+    start = date(2021, 1, 1)
+    db = Database(path)
+    db.import_rows("expense", [
+        (start + timedelta(days=rng.randrange(4 * 365)), f"Purchase {i}", round(rng.uniform(1, 200), 2), rng.choice(CATEGORIES))
+        for i in range(rows)
+    ], skip_duplicates=False)
+    db.import_rows("income", [(start + timedelta(days=30 * m), f"Salary {m}", 3000.0, "Salary") for m in range(48)])
+
+
+def run_server(path, port, cache_size):
+    from server import serve
+    asyncio.run(serve(Database(path), "127.0.0.1", port, cache_size))
+
+
+def urls(rng):
+    month = f"{rng.randint(2021, 2024)}-{rng.randint(1, 12):02d}"
+    return rng.choice([
+        f"/months/{month}",
+        f"/categories?kind=expense&from={month}-01&to={month}-28",
+        "/categories?kind=expense",
+        f"/transactions?kind=expense&from={month}-01&to={month}-28&limit=50",
+    ])
+
+
+async def client(port, seconds, conditional, seed, latencies, statuses):
+    rng = random.Random(seed)
+    etags = {}
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        url = urls(rng)
+        request = f"GET {url} HTTP/1.1\r\nHost: localhost\r\n"
+        if conditional and url in etags:
+            request += f"If-None-Match: {etags[url]}\r\n"
+        started = time.perf_counter()
+        writer.write((request + "\r\n").encode())
+        status = int((await reader.readline()).split()[1])
+        length, etag = 0, None
+        while (line := await reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+            elif name.lower() == "etag":
+                etag = value.strip()
+        await reader.readexactly(length)
+        latencies.append(time.perf_counter() - started)
+        statuses[status] = statuses.get(status, 0) + 1
+        if etag:
+            etags[url] = etag
+    writer.close()
+
+
+async def phase(port, clients, seconds, conditional):
+    latencies, statuses = [], {}
+    await asyncio.gather(*(client(port, seconds, conditional, i, latencies, statuses) for i in range(clients)))
+    return latencies, statuses
+
+
+def wait_for_port(port, timeout=30):
+    import socket
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000, help="expenses in the synthetic ledger")
+    parser.add_argument("--clients", type=int, default=16, help="concurrent keep-alive connections")
+    parser.add_argument("--seconds", type=float, default=5, help="duration of each phase")
+    parser.add_argument("--port", type=int, default=8799)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "budget.db")
+        print(f"Building ledger with {args.rows:,} expenses...")
+        build_ledger(path, args.rows)
+
+        mp = multiprocessing.get_context("spawn")
+        print(f"{'phase':<14} {'requests':>9} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8}  statuses")
+        for name, cache_size, conditional in (("no cache", 0, False), ("cached", 256, False), ("conditional", 256, True)):
+            server = mp.Process(target=run_server, args=(path, args.port, cache_size), daemon=True)
+            server.start()
+            try:
+                wait_for_port(args.port)
+                latencies, statuses = asyncio.run(phase(args.port, args.clients, args.seconds, conditional))
+            finally:
+                server.terminate()
+                server.join()
+            latencies.sort()
+            p50 = latencies[len(latencies) // 2] * 1000
+            p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+            print(f"{name:<14} {len(latencies):>9} {len(latencies) / args.seconds:>9.0f} {p50:>8.2f} {p99:>8.2f}  {statuses}")
+
+
+if __name__ == "__main__":
+    main()
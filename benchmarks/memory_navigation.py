@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Resident memory across a long month-navigation session on a large ledger.
+
+Builds a synthetic ledger, then replays what the dashboard does on every
+month change (monthly expenses/incomes, budget status) plus an Edit/Delete
+"Load" of one day, and prints RSS as it goes. With bounded read paths the
+RSS column should stay flat after warm-up.
+
+    python benchmarks/memory_navigation.py --rows 500000 --navigations 3000
+"""
+
+import argparse
+import os
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import Database  # noqa: E402
+
+CATEGORIES = ["Food", "Transport", "Housing", "Entertainment", "Kids", "Healthcare", "Shopping", "Other"]
+
+
+def rss_mib():
+    """Current resident set size (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 1024
+
+
+def build_ledger(path, rows, years):
+    start = date.today().replace(month=1, day=1) - timedelta(days=365 * years)
+    span = 365 * years
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE expenses (id INTEGER PRIMARY KEY, date DATE NOT NULL, "
+        "description VARCHAR NOT NULL, amount FLOAT NOT NULL, category VARCHAR NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE incomes (id INTEGER PRIMARY KEY, date DATE NOT NULL, "
+        "description VARCHAR NOT NULL, amount FLOAT NOT NULL, category VARCHAR NOT NULL)"
+    )
+    rng = random.Random(42)
+    conn.executemany(
+        "INSERT INTO expenses (date, description, amount, category) VALUES (?, ?, ?, ?)",
+        (
+            ((start + timedelta(days=rng.randrange(span))).isoformat(), f"Purchase {rng.randrange(5000)}",
+             round(rng.uniform(1, 200), 2), rng.choice(CATEGORIES))
+            for _ in range(rows)
+        ),
+    )
+    conn.executemany(
+        "INSERT INTO incomes (date, description, amount, category) VALUES (?, ?, ?, ?)",
+        (((start + timedelta(days=30 * m)).isoformat(), "Salary", 3000.0, "Salary") for m in range(12 * years)),
+    )
+    conn.commit()
+    conn.close()
+    return start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=200_000, help="expenses in the synthetic ledger")
+    parser.add_argument("--years", type=int, default=5, help="years the ledger spans")
+    parser.add_argument("--navigations", type=int, default=2000, help="month changes to replay")
+    parser.add_argument("--report-every", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "budget.db")
+        print(f"Building ledger with {args.rows:,} expenses over {args.years} years...")
+        start = build_ledger(path, args.rows, args.years)
+        db = Database(path)
+        months = [(start.year + m // 12, m % 12 + 1) for m in range(12 * args.years)]
+
+        rng = random.Random(7)
+        index = 0
+        baseline = rss_mib()
+        started = time.perf_counter()
+        print(f"{'navigations':>12} {'RSS MiB':>9} {'vs start':>9}")
+        print(f"{0:>12} {baseline:>9.1f} {0:>+9.1f}")
+        for n in range(1, args.navigations + 1):
+            index = max(0, min(len(months) - 1, index + rng.choice((-1, 1, 1))))
+            year, month = months[index]
+            db.get_monthly_expenses(year, month)
+            db.get_monthly_incomes(year, month)
+            db.get_budget_status(year, month)
+            db.get_expenses_on(date(year, month, rng.randint(1, 28)))
+            if n % args.report_every == 0:
+                rss = rss_mib()
+                print(f"{n:>12} {rss:>9.1f} {rss - baseline:>+9.1f}")
+        elapsed = time.perf_counter() - started
+        print(f"{args.navigations} navigations in {elapsed:.1f}s ({elapsed / args.navigations * 1000:.2f} ms each)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Concurrent writers and readers on one ledger file.
+
+Starts N writer and M reader processes, each with its own Database on the
+same budget.db, as separate TUI instances or a CLI import next to the TUI
+would. Writers add, edit, delete and import; readers load dashboard months
+and range totals. Prints throughput, latency percentiles, retries after lock
+contention, and lock errors that still reached the caller.
+
+    python benchmarks/stress_writers.py --writers 8 --readers 4 --seconds 10
+    python benchmarks/stress_writers.py --writers 8 --retries 1 --busy-timeout 0   # no protection
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from db import Database, is_lock_error  # noqa: E402
+
+CATEGORIES = ["Food", "Transport", "Housing", "Entertainment", "Kids", "Healthcare", "Shopping", "Other"]
+
+
+def random_day(rng):
+    return date(2025, 1, 1) + timedelta(days=rng.randrange(365))
+
+
+def writer_step(db, rng):
+    op = rng.random()
+    if op < 0.7:
+        db.add_expense(random_day(rng), f"Purchase {rng.randrange(1000)}", round(rng.uniform(1, 200), 2), rng.choice(CATEGORIES))
+    elif op < 0.85:
+        rows = db.get_expenses(limit=20)
+        if rows:
+            db.update_expense(rng.choice(rows).id, amount=round(rng.uniform(1, 200), 2))
+    elif op < 0.95:
+        rows = db.get_expenses(limit=20)
+        if rows:
+            db.delete_expense(rng.choice(rows).id)
+    else:
+        batch = [(random_day(rng), f"Imported {rng.randrange(10**6)}", 9.99, rng.choice(CATEGORIES)) for _ in range(50)]
+        db.import_rows("expense", batch)
+
+
+def reader_step(db, rng):
+    day = random_day(rng)
+    db.get_monthly_expenses(day.year, day.month)
+    db.get_monthly_incomes(day.year, day.month)
+    db.get_budget_status(day.year, day.month)
+    db.get_range_totals("expense", day, day + timedelta(days=90))
+
+
+def worker(role, index, path, args, barrier, results):
+    try:
+        # every worker creates or migrates the file as it opens it, all at once
+        db = Database(path, busy_timeout=args.busy_timeout, retry_attempts=args.retries)
+        rng = random.Random(index)
+        step = writer_step if role == "writer" else reader_step
+        latencies, lock_errors, other_errors = [], 0, 0
+        barrier.wait()  # start the clock once every process has opened the ledger
+        deadline = time.time() + args.seconds
+        while time.time() < deadline:
+            started = time.perf_counter()
+            try:
+                step(db, rng)
+            except Exception as e:
+                if is_lock_error(e):
+                    lock_errors += 1
+                else:
+                    other_errors += 1
+                continue
+            latencies.append(time.perf_counter() - started)
+        results.put((role, latencies, lock_errors, other_errors, db.lock_retries))
+    except Exception as e:
+        barrier.abort()
+        results.put((role, [], 0, 1, 0))
+        print(f"{role} {index} failed: {e}", file=sys.stderr)
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--busy-timeout", type=float, default=None, help="seconds to wait for a lock (default: db.BUSY_TIMEOUT)")
+    parser.add_argument("--retries", type=int, default=None, help="attempts per write (default: db.RETRY_ATTEMPTS; 1 disables retries)")
+    args = parser.parse_args()
+    if args.retries is None:
+        from db import RETRY_ATTEMPTS
+        args.retries = RETRY_ATTEMPTS
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "budget.db")
+        # spawn, not fork: every worker opens the file itself, like a separate app instance
+        mp = multiprocessing.get_context("spawn")
+        results = mp.Queue()
+        roles = [("writer", i) for i in range(args.writers)] + [("reader", 1000 + i) for i in range(args.readers)]
+        barrier = mp.Barrier(len(roles))
+        processes = [mp.Process(target=worker, args=(role, i, path, args, barrier, results)) for role, i in roles]
+        for p in processes:
+            p.start()
+        collected = [results.get() for _ in processes]
+        for p in processes:
+            p.join()
+
+    print(f"{args.writers} writer(s), {args.readers} reader(s), {args.seconds:g}s, "
+          f"busy timeout {args.busy_timeout if args.busy_timeout is not None else 'default'}, {args.retries} attempt(s) per write")
+    print(f"{'role':<8} {'ops':>8} {'ops/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'retries':>8} {'lock err':>9} {'other err':>9}")
+    for role in ("writer", "reader"):
+        rows = [r for r in collected if r[0] == role]
+        if not rows:
+            continue
+        latencies = sorted(l for r in rows for l in r[1])
+        lock_errors = sum(r[2] for r in rows)
+        other_errors = sum(r[3] for r in rows)
+        retries = sum(r[4] for r in rows)
+        print(
+            f"{role:<8} {len(latencies):>8} {len(latencies) / args.seconds:>8.1f} "
+            f"{percentile(latencies, 0.5) * 1000:>8.1f} {percentile(latencies, 0.99) * 1000:>8.1f} "
+            f"{(latencies[-1] if latencies else 0) * 1000:>8.1f} {retries:>8} {lock_errors:>9} {other_errors:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
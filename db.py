@@ -1,84 +1,685 @@
-from sqlalchemy import create_engine, Column, Integer, String, Float, Date
+from sqlalchemy import create_engine, event, Column, Integer, MetaData, String, Float, Date, DateTime, Text, bindparam, func, select, text
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.schema import CreateTable
+from datetime import date as date_type, datetime
+import functools
+import glob
+import hashlib
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import time
+
+logger = logging.getLogger(__name__)
 
 Base = declarative_base()
 
 class Expense(Base):
     __tablename__ = "expenses"
+    # ids are never reused, even after the newest rows are deleted or archived
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
     date = Column(Date, nullable=False)
     description = Column(String, nullable=False)
     amount = Column(Float, nullable=False)
     category = Column(String, nullable=False, default="Other")
+    fingerprint = Column(String, index=True)
 
 class Income(Base):
     __tablename__ = "incomes"
+    # ids are never reused, even after the newest rows are deleted or archived
+    __table_args__ = {"sqlite_autoincrement": True}
     id = Column(Integer, primary_key=True)
     date = Column(Date, nullable=False)
     description = Column(String, nullable=False)
     amount = Column(Float, nullable=False)
     category = Column(String, nullable=False, default="Salary")
+    fingerprint = Column(String, index=True)
+
+class JournalEntry(Base):
+    """Append-only record of every expense/income mutation; seq never goes backwards"""
+    __tablename__ = "journal"
+    __table_args__ = {"sqlite_autoincrement": True}
+    seq = Column(Integer, primary_key=True)
+    ts = Column(DateTime, nullable=False)
+    op = Column(String, nullable=False)        # insert / update / delete
+    kind = Column(String, nullable=False)      # expense / income
+    row_id = Column(Integer, nullable=False)
+    before = Column(Text)                      # JSON row state, NULL for inserts
+    after = Column(Text)                       # JSON row state, NULL for deletes
+
+MODELS = {"expense": Expense, "income": Income}
+
+
+def _snapshot(row):
+    """JSON-ready state of an expense/income row"""
+    return {"date": row.date.isoformat(), "description": row.description, "amount": float(row.amount), "category": row.category}
+
+
+def fingerprint(kind, date, amount, description):
+    """Normalized identity of a transaction: kind, day, amount in cents and description
+    lowercased with punctuation and extra whitespace removed"""
+    normalized = " ".join(re.sub(r"[^0-9a-z]+", " ", description.lower()).split())
+    key = f"{kind}|{date.isoformat()}|{round(float(amount) * 100)}|{normalized}"
+    return hashlib.sha1(key.encode()).hexdigest()[:20]
+
+
+def _rows(model):
+    """Core select of the columns the TUI shows, yielding Row named tuples"""
+    return select(model.id, model.date, model.description, model.amount, model.category)
+
+
+def _decode(state):
+    return {**state, "date": _as_date(state["date"])}
+
+
+def _as_date(value):
+    """Dates read through text() come back as ISO strings"""
+    return datetime.strptime(value, "%Y-%m-%d").date() if isinstance(value, str) else value
+
+class ArchivedYear(Base):
+    """A closed year whose transactions were moved into a cold partition file"""
+    __tablename__ = "archived_years"
+    year = Column(Integer, primary_key=True)
+    path = Column(String, nullable=False)
+    expense_count = Column(Integer, nullable=False, default=0)
+    income_count = Column(Integer, nullable=False, default=0)
+
+class ArchiveRollup(Base):
+    """Monthly per-category totals left in the hot file for archived years"""
+    __tablename__ = "archive_rollups"
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    kind = Column(String, primary_key=True)
+    category = Column(String, primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+    count = Column(Integer, nullable=False, default=0)
+
+# tables present in a cold per-year archive file
+PARTITION_TABLES = [Expense.__table__, Income.__table__]
+
+class BudgetLimit(Base):
+    __tablename__ = "budget_limits"
+    category = Column(String, primary_key=True)
+    amount = Column(Float, nullable=False)
+
+class CategorySpend(Base):
+    """Running spent-so-far counter per (month, category), adjusted by every expense mutation"""
+    __tablename__ = "category_spend"
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    category = Column(String, primary_key=True)
+    spent = Column(Float, nullable=False, default=0.0)
+
+class RangeNode(Base):
+    """One node of the per-(kind, category) Fenwick tree over days behind range totals"""
+    __tablename__ = "range_index"
+    kind = Column(String, primary_key=True)
+    node = Column(Integer, primary_key=True)
+    category = Column(String, primary_key=True)
+    total = Column(Float, nullable=False, default=0.0)
+
+class SchemaVersion(Base):
+    """One row per schema migration applied to this ledger file"""
+    __tablename__ = "schema_version"
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, nullable=False)
+
+class MigrationProgress(Base):
+    """Resume point of a batched data rewrite that was interrupted"""
+    __tablename__ = "migration_progress"
+    version = Column(Integer, primary_key=True)
+    table_name = Column(String, primary_key=True)
+    last_id = Column(Integer, nullable=False)
+
+# rows rewritten per committed transaction during a data migration
+MIGRATION_BATCH = 5000
+
+# Days are numbered from 1 = 1900-01-01. Any change touches at most
+# log2(RANGE_DAYS) + 1 nodes, and so does any prefix sum.
+RANGE_EPOCH = date_type(1899, 12, 31)
+RANGE_DAYS = 1 << 17  # through 2258
+
+
+def range_day(d):
+    """Day number of a date in the range index, or None when the index cannot hold it"""
+    day = d.toordinal() - RANGE_EPOCH.toordinal()
+    return day if 1 <= day <= RANGE_DAYS else None
+
+
+def check_date(d):
+    """Reject new transactions dated outside what the range index holds.
+
+    Rows already in a ledger are never rejected: the index skips them and
+    `rebuild_range_index` reports them.
+    """
+    if range_day(d) is None:
+        raise ValueError(f"Date outside the supported range (1900-01-01 to 2258-11-11): {d}")
+
+
+def _clamp_day(d):
+    return max(1, min(RANGE_DAYS + 1, d.toordinal() - RANGE_EPOCH.toordinal()))
+
+
+def _fenwick_path(day):
+    """Nodes whose totals include `day`"""
+    while day <= RANGE_DAYS:
+        yield day
+        day += day & -day
+
+
+def _fenwick_prefix(day):
+    """Nodes that add up to the total of days 1..day"""
+    while day > 0:
+        yield day
+        day -= day & -day
+
+
+# ─────────────────────────────
+# LOCK CONTENTION
+# ─────────────────────────────
+# Another process (a second TUI, a CLI import) can hold the write lock. Every
+# connection first waits up to BUSY_TIMEOUT for it. SQLite still gives up at
+# once in some cases, e.g. when a read transaction has to become a write while
+# another writer is pending, so write units of work are re-run from the start
+# with exponential backoff and jitter.
+BUSY_TIMEOUT = 5.0
+RETRY_ATTEMPTS = 5
+RETRY_BASE_DELAY = 0.05
+RETRY_MAX_DELAY = 1.0
+
+
+def is_lock_error(error):
+    """Whether an exception is SQLite reporting a locked database"""
+    return isinstance(error, OperationalError) and "is locked" in str(error.orig)
+
+
+def _retry_on_lock(method):
+    """Re-run a Database unit of work when it fails on a locked database.
+
+    StaleDataError (the row was changed or deleted by another process between
+    our read and our write) is retried too: the re-run sees the new state.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        for attempt in itertools.count(1):
+            try:
+                return method(self, *args, **kwargs)
+            except (OperationalError, StaleDataError) as e:
+                if isinstance(e, OperationalError) and not is_lock_error(e) or attempt >= self.retry_attempts:
+                    raise
+                self.lock_retries += 1
+                delay = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** (attempt - 1))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+    return wrapper
+
+
+# ─────────────────────────────
+# LEDGERS
+# ─────────────────────────────
+# The "default" ledger is the historical budget.db; any other named ledger
+# lives next to it as budget-<name>.db.
+DEFAULT_LEDGER = "default"
+LEDGER_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+
+_engines = {}
+
+
+def ledger_path(name):
+    """Database file backing a named ledger"""
+    if name == DEFAULT_LEDGER:
+        return "budget.db"
+    if not LEDGER_NAME_RE.match(name):
+        raise ValueError(f"Invalid ledger name: {name!r} (use letters, digits, - and _)")
+    return f"budget-{name}.db"
+
+
+def list_ledgers():
+    """Names of all ledgers that exist in the current directory"""
+    names = [DEFAULT_LEDGER] if os.path.exists("budget.db") else []
+    names += sorted(os.path.basename(p)[len("budget-"):-len(".db")] for p in glob.glob("budget-*.db"))
+    return names
+
+
+def get_engine(db_path, tables=None, busy_timeout=None):
+    """One pooled engine per ledger file, shared by every Database opened on it.
+
+    `busy_timeout` (seconds a connection waits for another writer's lock)
+    is fixed when the file's engine is first created in this process.
+    """
+    path = os.path.abspath(db_path)
+    engine = _engines.get(path)
+    if engine is None:
+        timeout = BUSY_TIMEOUT if busy_timeout is None else busy_timeout
+        engine = create_engine(f"sqlite:///{path}", echo=False, connect_args={"timeout": timeout})
+        with engine.begin() as conn:
+            # under the write lock, so two processes creating the same file don't race
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            Base.metadata.create_all(conn, tables=tables)
+        _engines[path] = engine
+    return engine
+
+
+def _begin_immediate(session, transaction, connection):
+    """Take the write lock as a write unit of work starts, before it reads anything.
+
+    A transaction that reads first and writes later cannot wait for the lock
+    (SQLite fails it at once to avoid a deadlock) and may act on rows another
+    process has just changed.
+    """
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+
+
+def month_range(year, month):
+    """[start, end) dates of a calendar month"""
+    start = datetime(year, month, 1).date()
+    end = datetime(year + 1, 1, 1).date() if month == 12 else datetime(year, month + 1, 1).date()
+    return start, end
+
+
+def consolidated_report(ledgers, year=None, month=None):
+    """Totals per (ledger, kind, category) across several ledgers.
+
+    The ledger files are ATTACHed to a scratch connection and aggregated in a
+    single statement, so SQLite does the merge instead of Python. Archived
+    years are counted through their rollups.
+    Returns a list of (ledger, kind, category, total) rows.
+    """
+    if not ledgers:
+        return []
+    if len(ledgers) > 10:
+        raise ValueError("SQLite can attach at most 10 ledgers at once")
+
+    parts, params = [], {}
+    for i, name in enumerate(ledgers):
+        path = ledger_path(name)
+        if not os.path.exists(path):
+            raise ValueError(f"Ledger not found: {name}")
+        get_engine(path)  # brings older ledger files up to the current tables
+        params[f"path{i}"] = os.path.abspath(path)
+        params[f"name{i}"] = name
+        parts.append(f"SELECT :name{i} AS ledger, 'expense' AS kind, category, amount, date FROM l{i}.expenses")
+        parts.append(f"SELECT :name{i} AS ledger, 'income' AS kind, category, amount, date FROM l{i}.incomes")
+        parts.append(
+            f"SELECT :name{i} AS ledger, kind, category, total AS amount, "
+            f"printf('%04d-%02d-01', year, month) AS date FROM l{i}.archive_rollups"
+        )
+
+    where = ""
+    if year and month:
+        params["start"], params["end"] = month_range(year, month)
+        where = "WHERE date >= :start AND date < :end"
+    query = (
+        f"SELECT ledger, kind, category, SUM(amount) FROM ({' UNION ALL '.join(parts)}) {where} "
+        "GROUP BY ledger, kind, category ORDER BY ledger, kind, category"
+    )
+
+    engine = create_engine("sqlite://")
+    try:
+        with engine.connect() as conn:
+            for i in range(len(ledgers)):
+                conn.execute(text(f"ATTACH DATABASE :path{i} AS l{i}"), {f"path{i}": params[f"path{i}"]})
+            return [tuple(row) for row in conn.execute(text(query), params)]
+    finally:
+        engine.dispose()
 
 
 class Database:
-    def __init__(self, db_path="budget.db"):
-        self.engine = create_engine(f"sqlite:///{db_path}", echo=False)
-        Base.metadata.create_all(self.engine)
-        Session = sessionmaker(bind=self.engine)
-        self.session = Session()
+    def __init__(self, db_path="budget.db", progress=None, busy_timeout=None, retry_attempts=RETRY_ATTEMPTS):
+        self.db_path = db_path
+        self.engine = get_engine(db_path, busy_timeout=busy_timeout)
+        # attempts per write unit of work before a lock error reaches the caller
+        self.retry_attempts = retry_attempts
+        self.lock_retries = 0
+        # Writes open one short-lived session per unit of work; reads go through
+        # Core selects and return Row tuples, so nothing accumulates in an
+        # identity map while the app is running.
+        self.Session = sessionmaker(bind=self.engine, expire_on_commit=False)
+        event.listen(self.Session, "after_begin", _begin_immediate)
+        self._undo = []
+        self._redo = []
 
         # expose models so tui.py can access them (self.app.db.Expense)
         self.Expense = Expense
         self.Income = Income
 
+        # `progress(version, name, done, total)` reports batched upgrades of older ledger files
+        self.migrate(progress)
+
+    def close(self):
+        """Forget this ledger's undo history; no session outlives a unit of work and the pooled engine stays open"""
+        self._undo.clear()
+        self._redo.clear()
+
+    def _all(self, stmt, engine=None):
+        with (engine or self.engine).connect() as conn:
+            return conn.execute(stmt).all()
+
+    def _scalar(self, stmt):
+        with self.engine.connect() as conn:
+            return conn.execute(stmt).scalar()
+
+    # ─────────────────────────────
+    # SCHEMA MIGRATIONS
+    # ─────────────────────────────
+    # create_all only adds missing tables, so every change to an existing
+    # table (or data backfill) is a numbered migration below. They run in
+    # order, once per ledger file, and the applied versions are kept in
+    # schema_version. A migration may be interrupted before its version is
+    # recorded, so each one must be safe to run again.
+    MIGRATIONS = [
+        (1, "fingerprint columns", "_migrate_fingerprints"),
+        (2, "seed spend counters", "_migrate_spend_counters"),
+        (3, "seed journal", "_migrate_journal"),
+        (4, "seed range index", "_migrate_range_index"),
+        (5, "monotonic transaction ids", "_migrate_autoincrement"),
+    ]
+
+    def schema_version(self):
+        """Highest migration applied to this ledger (0 for a file that predates versioning)"""
+        return self._scalar(select(func.max(SchemaVersion.version))) or 0
+
+    def migrate(self, progress=None):
+        """Apply pending migrations in order; returns the versions applied.
+
+        `progress(version, name, done, total)` is called after each batch of a
+        data rewrite.
+        """
+        current = self.schema_version()
+        applied = []
+        for version, name, method in self.MIGRATIONS:
+            if version <= current:
+                continue
+            getattr(self, method)(version, name, progress)
+            with self.engine.begin() as conn:
+                conn.execute(
+                    SchemaVersion.__table__.insert().prefix_with("OR IGNORE"),
+                    {"version": version, "name": name, "applied_at": datetime.now()},
+                )
+            applied.append(version)
+        return applied
+
+    def _rewrite_in_batches(self, version, name, table, where, rewrite, progress=None):
+        """Rewrite the rows of `table` matching `where` in id order, MIGRATION_BATCH per transaction.
+
+        The table must first be marked pending with `_mark_pending`.
+        `rewrite(conn, rows)` gets each batch of full rows. The last id done is
+        committed with the batch, so an interrupted upgrade resumes from there
+        instead of starting over, and no batch holds the write lock for long.
+        Each batch reads its cursor under the write lock, so another process
+        upgrading the same file at once shares the work instead of redoing it.
+        """
+        key = (MigrationProgress.version == version) & (MigrationProgress.table_name == table)
+        with self.engine.connect() as conn:
+            last_id = conn.execute(select(MigrationProgress.last_id).where(key)).scalar() or 0
+            total = conn.execute(
+                text(f"SELECT COUNT(*) FROM {table} WHERE id > :last_id AND {where}"), {"last_id": last_id}
+            ).scalar()
+        done = 0
+        while True:
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                last_id = conn.execute(select(MigrationProgress.last_id).where(key)).scalar()
+                if last_id is None:
+                    break  # finished, here or by another process
+                rows = conn.execute(text(
+                    f"SELECT * FROM {table} WHERE id > :last_id AND {where} ORDER BY id LIMIT :batch"
+                ), {"last_id": last_id, "batch": MIGRATION_BATCH}).all()
+                if not rows:
+                    conn.execute(MigrationProgress.__table__.delete().where(key))
+                    break
+                rewrite(conn, rows)
+                last_id = rows[-1].id
+                conn.execute(
+                    MigrationProgress.__table__.insert().prefix_with("OR REPLACE"),
+                    {"version": version, "table_name": table, "last_id": last_id},
+                )
+            done += len(rows)
+            if progress:
+                progress(version, name, done, total)
+
+    def _mark_pending(self, conn, version, tables):
+        """Record batched rewrites of `tables` as started (a no-op for ones already under way)"""
+        conn.execute(MigrationProgress.__table__.insert().prefix_with("OR IGNORE"), [
+            {"version": version, "table_name": table, "last_id": 0} for table in tables
+        ])
+
+    def _migrate_fingerprints(self, version, name, progress):
+        """Add, index and backfill the fingerprint column on ledgers created before it existed"""
+        for kind, model in MODELS.items():
+            table = model.__tablename__
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                columns = {col[1] for col in conn.exec_driver_sql(f"PRAGMA table_info({table})")}
+                if "fingerprint" not in columns:
+                    conn.exec_driver_sql(f"ALTER TABLE {table} ADD COLUMN fingerprint VARCHAR")
+                conn.exec_driver_sql(f"CREATE INDEX IF NOT EXISTS ix_{table}_fingerprint ON {table} (fingerprint)")
+                if conn.execute(select(model.id).where(model.fingerprint.is_(None)).limit(1)).first():
+                    self._mark_pending(conn, version, [table])
+
+            def backfill(conn, rows, kind=kind, model=model):
+                conn.execute(
+                    model.__table__.update().where(model.id == bindparam("row_id")).values(fingerprint=bindparam("fp")),
+                    [{"row_id": r.id, "fp": fingerprint(kind, _as_date(r.date), r.amount, r.description)} for r in rows],
+                )
+
+            self._rewrite_in_batches(version, name, table, "fingerprint IS NULL", backfill, progress)
+
+    def _migrate_spend_counters(self, version, name, progress):
+        if self._scalar(select(Expense.id).limit(1)) is not None and self._scalar(select(CategorySpend.year).limit(1)) is None:
+            self.reconcile_spending()
+
+    def _migrate_journal(self, version, name, progress):
+        pending = select(MigrationProgress.table_name).where(MigrationProgress.version == version)
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            if (conn.execute(pending).first() is None and conn.execute(select(JournalEntry.seq).limit(1)).first() is None
+                    and any(conn.execute(select(model.id).limit(1)).first() for model in MODELS.values())):
+                # mark both tables first, so an upgrade interrupted between them still seeds the second
+                self._mark_pending(conn, version, [model.__tablename__ for model in MODELS.values()])
+        for kind, model in MODELS.items():
+            if self._scalar(pending.where(MigrationProgress.table_name == model.__tablename__)) is not None:
+                self._seed_journal(version, name, kind, progress)
+
+    def _migrate_range_index(self, version, name, progress):
+        if self._has_transactions() and self._scalar(select(RangeNode.node).limit(1)) is None:
+            skipped = self.rebuild_range_index()
+            if skipped:
+                logger.warning("%d day(s) of transactions fall outside 1900-2258 and are left out of range totals "
+                               "(run `reconcile` to list them)", len(skipped))
+
+    def _migrate_autoincrement(self, version, name, progress):
+        """Rebuild the expense/income tables with AUTOINCREMENT, which SQLite cannot add in place.
+
+        Rows are copied into `<table>_new` in batches while triggers mirror
+        every write to the old table, then one short transaction swaps the
+        tables and starts the id sequence above every id handed out so far.
+        """
+        columns = "id, date, description, amount, category, fingerprint"
+        values = ", ".join(f"new.{column}" for column in columns.split(", "))
+        for kind, model in MODELS.items():
+            table, new = model.__tablename__, f"{model.__tablename__}_new"
+            exists = "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?"
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                if "AUTOINCREMENT" in conn.exec_driver_sql(exists, (table,)).scalar():
+                    continue
+                if conn.exec_driver_sql(exists, (new,)).scalar() is None:
+                    conn.execute(CreateTable(model.__table__.to_metadata(MetaData(), name=new)))
+                    # index names are global: move the index now, while the new table is empty
+                    conn.exec_driver_sql(f"DROP INDEX IF EXISTS ix_{table}_fingerprint")
+                    conn.exec_driver_sql(f"CREATE INDEX ix_{table}_fingerprint ON {new} (fingerprint)")
+                    conn.exec_driver_sql(
+                        f"CREATE TRIGGER {new}_insert AFTER INSERT ON {table} "
+                        f"BEGIN INSERT OR REPLACE INTO {new} ({columns}) VALUES ({values}); END"
+                    )
+                    conn.exec_driver_sql(
+                        f"CREATE TRIGGER {new}_update AFTER UPDATE ON {table} BEGIN "
+                        f"DELETE FROM {new} WHERE id = old.id; INSERT OR REPLACE INTO {new} ({columns}) VALUES ({values}); END"
+                    )
+                    conn.exec_driver_sql(
+                        f"CREATE TRIGGER {new}_delete AFTER DELETE ON {table} BEGIN DELETE FROM {new} WHERE id = old.id; END"
+                    )
+                    self._mark_pending(conn, version, [table])
+
+            def copy(conn, rows, table=table, new=new):
+                conn.execute(text(
+                    f"INSERT OR REPLACE INTO {new} ({columns}) SELECT {columns} FROM {table} WHERE id BETWEEN :first AND :last"
+                ), {"first": rows[0].id, "last": rows[-1].id})
+
+            self._rewrite_in_batches(version, name, table, "1", copy, progress)
+
+            # ids of deleted and archived rows, which must never be handed out again
+            high = max([
+                self._scalar(select(func.max(JournalEntry.row_id)).where(JournalEntry.kind == kind)) or 0,
+                *(self._all(select(func.max(model.id)), engine)[0][0] or 0 for engine in self._cold_engines()),
+            ])
+            with self.engine.begin() as conn:
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                if conn.exec_driver_sql(exists, (new,)).scalar() is not None:
+                    conn.exec_driver_sql(f"DROP TABLE {table}")  # and its triggers
+                    conn.exec_driver_sql(f"ALTER TABLE {new} RENAME TO {table}")
+                high = max(high, conn.execute(select(func.max(model.id))).scalar() or 0)
+                conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) SELECT ?, 0 "
+                                     "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = ?)", (table, table))
+                conn.exec_driver_sql("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = ?", (high, table))
+
+    def _has_transactions(self):
+        return any(self._scalar(select(model.id).limit(1)) is not None for model in MODELS.values())
+
+    # ─────────────────────────────
+    # SPEND COUNTERS
+    # ─────────────────────────────
+    def _adjust_spend(self, session, date, category, delta):
+        """Apply an expense delta to its (month, category) counter. Caller commits."""
+        key = (date.year, date.month, category)
+        counter = session.get(CategorySpend, key)
+        if counter is None:
+            counter = CategorySpend(year=date.year, month=date.month, category=category, spent=0.0)
+            session.add(counter)
+        counter.spent += delta
+
+    # ─────────────────────────────
+    # RANGE TOTALS
+    # ─────────────────────────────
+    def _adjust_range(self, session, kind, date, category, delta):
+        """Apply an amount delta to the range index nodes covering `date`. Caller commits."""
+        day = range_day(date)
+        if day is None:
+            return  # an old out-of-range row being edited or deleted; it was never indexed
+        session.execute(text(
+            "INSERT INTO range_index (kind, node, category, total) VALUES (:kind, :node, :category, :delta) "
+            "ON CONFLICT (kind, node, category) DO UPDATE SET total = total + excluded.total"
+        ), [{"kind": kind, "node": node, "category": category, "delta": delta} for node in _fenwick_path(day)])
+
+    def get_range_totals(self, kind, start=None, end=None):
+        """Totals per category for dates in [start, end), from at most two prefix sums of the range index"""
+        # dates beyond either end of the index are clamped to it
+        lo = _clamp_day(start) - 1 if start else 0
+        hi = _clamp_day(end) - 1 if end else RANGE_DAYS
+        if hi <= lo:
+            return {}
+        # nodes shared by both prefixes cancel out and are never read
+        plus, minus = set(_fenwick_prefix(hi)), set(_fenwick_prefix(lo))
+        signs = {**{node: -1 for node in minus - plus}, **{node: 1 for node in plus - minus}}
+        rows = self._all(
+            select(RangeNode.category, RangeNode.node, RangeNode.total)
+            .where(RangeNode.kind == kind, RangeNode.node.in_(list(signs)))
+        )
+        totals = {}
+        for category, node, total in rows:
+            totals[category] = totals.get(category, 0.0) + signs[node] * total
+        return {category: round(total, 2) for category, total in totals.items() if abs(total) >= 0.005}
+
+    @_retry_on_lock
+    def rebuild_range_index(self):
+        """Recompute the range index from the raw transactions, archived years included.
+
+        Returns (kind, date, category, total) for days the index cannot hold
+        (e.g. a mistyped year); those are left out of range totals.
+        """
+        nodes, skipped = {}, []
+        with self.engine.begin() as conn:
+            # read and rewrite under one write lock, so no add/edit/delete (or
+            # archive, which also needs it) lands between the two
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            for kind, model in MODELS.items():
+                daily = select(model.date, model.category, func.sum(model.amount)).group_by(model.date, model.category)
+                rows = conn.execute(daily).all()
+                for engine in self._cold_engines():
+                    rows += self._all(daily, engine)
+                for d, category, total in rows:
+                    day = range_day(d)
+                    if day is None:
+                        skipped.append((kind, d, category, total))
+                        continue
+                    for node in _fenwick_path(day):
+                        key = (kind, node, category)
+                        nodes[key] = nodes.get(key, 0.0) + total
+            conn.execute(RangeNode.__table__.delete())
+            if nodes:
+                conn.execute(RangeNode.__table__.insert(), [
+                    {"kind": kind, "node": node, "category": category, "total": total}
+                    for (kind, node, category), total in nodes.items()
+                ])
+        return skipped
+
     # ─────────────────────────────
     # ADD METHODS
     # ─────────────────────────────
+    @_retry_on_lock
     def add_expense(self, date, description, amount, category="Other"):
-        exp = Expense(date=date, description=description, amount=amount, category=category)
-        self.session.add(exp)
-        self.session.commit()
+        values = {"date": date, "description": description, "amount": amount, "category": category}
+        check_date(date)
+        with self.Session.begin() as session:
+            entry = self._apply(session, "expense", None, values)
+        self._record(entry)
 
+    @_retry_on_lock
     def add_income(self, date, description, amount, category="Salary"):
-        inc = Income(date=date, description=description, amount=amount, category=category)
-        self.session.add(inc)
-        self.session.commit()
+        values = {"date": date, "description": description, "amount": amount, "category": category}
+        check_date(date)
+        with self.Session.begin() as session:
+            entry = self._apply(session, "income", None, values)
+        self._record(entry)
 
     # ─────────────────────────────
     # UPDATE METHODS
     # ─────────────────────────────
     def update_expense(self, expense_id, date=None, description=None, amount=None, category=None):
         """Update an expense entry. Now supports date editing."""
-        exp = self.session.query(Expense).filter_by(id=expense_id).first()
-        if not exp:
-            return False
-        if date is not None:
-            exp.date = date
-        if description:
-            exp.description = description
-        if amount is not None:
-            exp.amount = amount
-        if category:
-            exp.category = category
-        self.session.commit()
-        return True
+        return self._update("expense", expense_id, date, description, amount, category)
 
     def update_income(self, income_id, date=None, description=None, amount=None, category=None):
         """Update an income entry. Now supports date editing."""
-        inc = self.session.query(Income).filter_by(id=income_id).first()
-        if not inc:
-            return False
+        return self._update("income", income_id, date, description, amount, category)
+
+    @_retry_on_lock
+    def _update(self, kind, row_id, date, description, amount, category):
         if date is not None:
-            inc.date = date
-        if description:
-            inc.description = description
-        if amount is not None:
-            inc.amount = amount
-        if category:
-            inc.category = category
-        self.session.commit()
+            check_date(date)
+        with self.Session.begin() as session:
+            row = session.get(MODELS[kind], row_id)
+            if not row:
+                return False
+            values = _decode(_snapshot(row))
+            if date is not None:
+                values["date"] = date
+            if description:
+                values["description"] = description
+            if amount is not None:
+                values["amount"] = amount
+            if category:
+                values["category"] = category
+            entry = self._apply(session, kind, row_id, values)
+        self._record(entry)
         return True
 
     # ─────────────────────────────
@@ -86,90 +687,574 @@ class Database:
     # ─────────────────────────────
     def delete_expense(self, expense_id):
         """Delete an expense by ID"""
-        exp = self.session.query(Expense).filter_by(id=expense_id).first()
-        if not exp:
-            return False
-        self.session.delete(exp)
-        self.session.commit()
-        return True
+        return self._delete("expense", expense_id)
 
     def delete_income(self, income_id):
         """Delete an income by ID"""
-        inc = self.session.query(Income).filter_by(id=income_id).first()
-        if not inc:
+        return self._delete("income", income_id)
+
+    @_retry_on_lock
+    def _delete(self, kind, row_id):
+        with self.Session.begin() as session:
+            entry = self._apply(session, kind, row_id, None)
+        if not entry:
             return False
-        self.session.delete(inc)
-        self.session.commit()
+        self._record(entry)
         return True
 
+    # ─────────────────────────────
+    # JOURNAL / UNDO
+    # ─────────────────────────────
+    # Every mutation goes through _apply, which keeps the spend counters and
+    # range index in step and appends a journal entry in the same transaction.
+    def _apply(self, session, kind, row_id, values):
+        """Bring one row to `values` (None deletes it) and journal it. Caller commits.
+
+        Returns the journal entry, or None when there was nothing to change.
+        """
+        model = MODELS[kind]
+        row = session.get(model, row_id) if row_id is not None else None
+        if row is None and values is None:
+            return None
+        before = _snapshot(row) if row is not None else None
+
+        if row is not None:
+            self._adjust_range(session, kind, row.date, row.category, -row.amount)
+            if kind == "expense":
+                self._adjust_spend(session, row.date, row.category, -row.amount)
+        if values is None:
+            op = "delete"
+            session.delete(row)
+        else:
+            if row is None:
+                op = "insert"
+                row = model(id=row_id)
+                session.add(row)
+            else:
+                op = "update"
+            for field, value in values.items():
+                setattr(row, field, value)
+            row.fingerprint = fingerprint(kind, row.date, row.amount, row.description)
+            self._adjust_range(session, kind, row.date, row.category, row.amount)
+            if kind == "expense":
+                self._adjust_spend(session, row.date, row.category, row.amount)
+        session.flush()
+
+        entry = JournalEntry(
+            ts=datetime.now(),
+            op=op,
+            kind=kind,
+            row_id=row.id,
+            before=json.dumps(before) if before else None,
+            after=json.dumps(_snapshot(row)) if values is not None else None,
+        )
+        session.add(entry)
+        session.flush()
+        return entry
+
+    def _record(self, entry):
+        """Make a committed user mutation the next one to undo"""
+        self._undo.append(entry.seq)
+        self._redo.clear()
+
+    @_retry_on_lock
+    def _replay(self, seq, state_from, state_to, action):
+        with self.Session.begin() as session:
+            entry = session.get(JournalEntry, seq)
+            row = session.get(MODELS[entry.kind], entry.row_id)
+            current = _snapshot(row) if row is not None else None
+            expected = getattr(entry, state_from)
+            if current != (json.loads(expected) if expected else None):
+                raise ValueError(f"Cannot {action}: {entry.kind} #{entry.row_id} was changed since; skipped it")
+            target = getattr(entry, state_to)
+            self._apply(session, entry.kind, entry.row_id, _decode(json.loads(target)) if target else None)
+        return entry
+
+    def undo(self):
+        """Revert the latest change made through this Database; returns its journal entry or None"""
+        return self._step(self._undo, self._redo, "after", "before", "undo")
+
+    def redo(self):
+        """Re-apply the latest undone change; returns its journal entry or None"""
+        return self._step(self._redo, self._undo, "before", "after", "redo")
+
+    def _step(self, source, target, state_from, state_to, action):
+        if not source:
+            return None
+        seq = source.pop()
+        try:
+            entry = self._replay(seq, state_from, state_to, action)
+        except ValueError:
+            # the row was changed elsewhere: drop this step so older ones stay reachable
+            raise
+        except Exception:
+            source.append(seq)
+            raise
+        target.append(seq)
+        return entry
+
+    def journal_head(self):
+        """Sequence number of the latest journal entry (0 when empty)"""
+        return self._scalar(select(func.max(JournalEntry.seq))) or 0
+
+    def changes_since(self, seq):
+        """Journal entries after `seq`, oldest first, as plain dicts"""
+        stmt = (
+            select(JournalEntry.__table__)
+            .where(JournalEntry.seq > seq)
+            .order_by(JournalEntry.seq)
+            .execution_options(yield_per=1000)
+        )
+        with self.engine.connect() as conn:
+            for entry in conn.execute(stmt):
+                yield {
+                    "seq": entry.seq,
+                    "ts": entry.ts.isoformat(),
+                    "op": entry.op,
+                    "kind": entry.kind,
+                    "id": entry.row_id,
+                    "before": json.loads(entry.before) if entry.before else None,
+                    "after": json.loads(entry.after) if entry.after else None,
+                }
+
+    def _seed_journal(self, version, name, kind, progress=None):
+        """Journal existing rows as inserts so `changes_since(0)` is a full snapshot"""
+        now = datetime.now().isoformat(sep=" ")
+        table = MODELS[kind].__tablename__
+
+        def seed(conn, rows):
+            conn.execute(text(
+                "INSERT INTO journal (ts, op, kind, row_id, before, after) "
+                "SELECT :now, 'insert', :kind, id, NULL, json_object("
+                "'date', date, 'description', description, 'amount', amount, 'category', category) "
+                f"FROM {table} WHERE id BETWEEN :first AND :last ORDER BY id"
+            ), {"now": now, "kind": kind, "first": rows[0].id, "last": rows[-1].id})
+
+        self._rewrite_in_batches(version, name, table, "1", seed, progress)
+
+    # ─────────────────────────────
+    # DUPLICATES / IMPORT
+    # ─────────────────────────────
+    def find_duplicate(self, kind, date, amount, description):
+        """An existing row with the same fingerprint, or None (one indexed lookup)"""
+        model = MODELS[kind]
+        fp = fingerprint(kind, date, amount, description)
+        rows = self._all(_rows(model).where(model.fingerprint == fp).limit(1))
+        return rows[0] if rows else None
+
+    def find_duplicate_groups(self, kind):
+        """Groups of rows sharing a fingerprint, found in a single grouped query"""
+        model = MODELS[kind]
+        dupes = select(model.fingerprint).group_by(model.fingerprint).having(func.count() > 1).subquery()
+        stmt = (
+            _rows(model).add_columns(model.fingerprint)
+            .join(dupes, model.fingerprint == dupes.c.fingerprint)
+            .order_by(model.fingerprint, model.id)
+        )
+        return [list(group) for _, group in itertools.groupby(self._all(stmt), key=lambda row: row.fingerprint)]
+
+    @_retry_on_lock
+    def import_rows(self, kind, rows, skip_duplicates=True):
+        """Bulk-insert (date, description, amount, category) rows.
+
+        Rows are staged in a temp table and compared with the ledger through an
+        indexed anti-join on fingerprint, so the check is set-based rather than
+        row by row. Duplicates are skipped, or imported anyway and only flagged
+        when `skip_duplicates` is False. Counters, range index and journal are
+        updated in the same statement batch; imports are not on the undo stack.
+        Returns (imported_count, duplicate_rows).
+        """
+        model = MODELS[kind]
+        table = model.__tablename__
+        # validate every date before anything is written
+        for d, *_ in rows:
+            check_date(d)
+        staged = [
+            {"date": d.isoformat(), "description": desc, "amount": amount, "category": category,
+             "fingerprint": fingerprint(kind, d, amount, desc)}
+            for d, desc, amount, category in rows
+        ]
+        if not staged:
+            return 0, []
+
+        with self.engine.begin() as conn:
+            # write lock first, as for sessions (see _begin_immediate); the staging DDL stays inside it
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+            conn.exec_driver_sql(
+                "CREATE TEMP TABLE import_staging (date DATE, description VARCHAR, amount FLOAT, category VARCHAR, fingerprint VARCHAR)"
+            )
+            try:
+                conn.execute(text(
+                    "INSERT INTO import_staging VALUES (:date, :description, :amount, :category, :fingerprint)"
+                ), staged)
+                exists = f"EXISTS (SELECT 1 FROM {table} t WHERE t.fingerprint = s.fingerprint)"
+                duplicates = conn.execute(text(
+                    f"SELECT date, description, amount, category FROM import_staging s WHERE {exists}"
+                )).all()
+
+                last_id = conn.execute(select(func.max(model.id))).scalar() or 0
+                conn.execute(text(
+                    f"INSERT INTO {table} (date, description, amount, category, fingerprint) "
+                    "SELECT date, description, amount, category, fingerprint FROM import_staging s"
+                    + (f" WHERE NOT {exists}" if skip_duplicates else "")
+                ))
+                new_rows = f"FROM {table} WHERE id > :last_id"
+                imported = conn.execute(text(f"SELECT COUNT(*) {new_rows}"), {"last_id": last_id}).scalar()
+
+                if kind == "expense":
+                    conn.execute(text(
+                        "INSERT INTO category_spend (year, month, category, spent) "
+                        "SELECT CAST(strftime('%Y', date) AS INTEGER), CAST(strftime('%m', date) AS INTEGER), "
+                        f"category, SUM(amount) {new_rows} GROUP BY 1, 2, 3 "
+                        "ON CONFLICT (year, month, category) DO UPDATE SET spent = spent + excluded.spent"
+                    ), {"last_id": last_id})
+                # every new day walks up its Fenwick path; nodes shared by several days are summed first
+                conn.execute(text(
+                    "WITH RECURSIVE nodes (category, node, total) AS ("
+                    f"SELECT category, CAST(julianday(date) - julianday('{RANGE_EPOCH}') AS INTEGER), SUM(amount) "
+                    f"{new_rows} GROUP BY 1, 2 "
+                    "UNION ALL SELECT category, node + (node & -node), total FROM nodes "
+                    "WHERE node + (node & -node) <= :days) "
+                    "INSERT INTO range_index (kind, node, category, total) "
+                    "SELECT :kind, node, category, SUM(total) FROM nodes GROUP BY node, category "
+                    "ON CONFLICT (kind, node, category) DO UPDATE SET total = total + excluded.total"
+                ), {"kind": kind, "last_id": last_id, "days": RANGE_DAYS})
+                conn.execute(text(
+                    "INSERT INTO journal (ts, op, kind, row_id, before, after) "
+                    "SELECT :now, 'insert', :kind, id, NULL, json_object("
+                    "'date', date, 'description', description, 'amount', amount, 'category', category) "
+                    f"{new_rows} ORDER BY id"
+                ), {"now": datetime.now().isoformat(sep=" "), "kind": kind, "last_id": last_id})
+            finally:
+                conn.exec_driver_sql("DROP TABLE temp.import_staging")
+        return imported, duplicates
+
     # ─────────────────────────────
     # FETCH METHODS
     # ─────────────────────────────
+    # Reads return Row named tuples (id, date, description, amount, category).
+    # They are routed by date range: the hot file always answers, and the
+    # cold file of an archived year is only opened when the range reaches it.
     def get_expenses(self, limit=None):
-        q = self.session.query(Expense).order_by(Expense.date.desc())
-        return q.limit(limit).all() if limit else q.all()
+        return self._fetch_latest(Expense, limit)
 
     def get_incomes(self, limit=None):
-        q = self.session.query(Income).order_by(Income.date.desc())
-        return q.limit(limit).all() if limit else q.all()
+        return self._fetch_latest(Income, limit)
 
     def get_monthly_expenses(self, year, month):
-        start = datetime(year, month, 1).date()
-        if month == 12:
-            end = datetime(year + 1, 1, 1).date()
-        else:
-            end = datetime(year, month + 1, 1).date()
-        return self.session.query(Expense).filter(Expense.date >= start, Expense.date < end).all()
+        return self._fetch_range(Expense, *month_range(year, month))
 
     def get_monthly_incomes(self, year, month):
-        start = datetime(year, month, 1).date()
-        if month == 12:
-            end = datetime(year + 1, 1, 1).date()
-        else:
-            end = datetime(year, month + 1, 1).date()
-        return self.session.query(Income).filter(Income.date >= start, Income.date < end).all()
+        return self._fetch_range(Income, *month_range(year, month))
+
+    def get_expenses_on(self, date):
+        """Expenses of a single day (hot file only; archived years are read-only)"""
+        return self._all(_rows(Expense).where(Expense.date == date).order_by(Expense.id))
+
+    def get_incomes_on(self, date):
+        """Incomes of a single day (hot file only; archived years are read-only)"""
+        return self._all(_rows(Income).where(Income.date == date).order_by(Income.id))
+
+    def get_expense(self, expense_id):
+        """One expense by ID, or None"""
+        rows = self._all(_rows(Expense).where(Expense.id == expense_id))
+        return rows[0] if rows else None
+
+    def get_income(self, income_id):
+        """One income by ID, or None"""
+        rows = self._all(_rows(Income).where(Income.id == income_id))
+        return rows[0] if rows else None
+
+    def get_page(self, kind, start=None, end=None, limit=50, offset=0):
+        """One page of transactions in [start, end), newest first"""
+        model = MODELS[kind]
+        stmt = _rows(model).order_by(model.date.desc(), model.id.desc())
+        if start is not None:
+            stmt = stmt.where(model.date >= start)
+        if end is not None:
+            stmt = stmt.where(model.date < end)
+        cold = self._cold_engines(start or date_type.min, end or date_type.max)
+        if not cold:
+            return self._all(stmt.limit(limit).offset(offset))
+        # each partition returns its first offset + limit rows; the merged page is cut from those
+        rows = []
+        for engine in [self.engine, *cold]:
+            rows += self._all(stmt.limit(offset + limit), engine)
+        rows.sort(key=lambda r: (r.date, r.id), reverse=True)
+        return rows[offset:offset + limit]
+
+    def iter_batches(self, kind, start=None, end=None, categories=None, batch_size=10000):
+        """Stream (date, description, amount, category) rows of one kind in batches.
+
+        Date ([start, end)) and category filters are applied in SQL and rows are
+        fetched `batch_size` at a time, so exports never hold the whole ledger.
+        """
+        model = MODELS[kind]
+        stmt = select(model.date, model.description, model.amount, model.category).order_by(model.date, model.id)
+        if start is not None:
+            stmt = stmt.where(model.date >= start)
+        if end is not None:
+            stmt = stmt.where(model.date < end)
+        if categories:
+            stmt = stmt.where(model.category.in_(categories))
+        stmt = stmt.execution_options(yield_per=batch_size)
+
+        cold = self._cold_engines(start or date_type.min, end or date_type.max)
+        for engine in [*reversed(cold), self.engine]:
+            with engine.connect() as conn:
+                for batch in conn.execute(stmt).partitions():
+                    yield batch
+
+    def _fetch_latest(self, model, limit=None):
+        stmt = _rows(model).order_by(model.date.desc())
+        if limit:
+            stmt = stmt.limit(limit)
+        rows = self._all(stmt)
+        cold = self._cold_engines()
+        if not cold:
+            return rows
+        for engine in cold:
+            rows += self._all(stmt, engine)
+        rows.sort(key=lambda r: r.date, reverse=True)
+        return rows[:limit] if limit else rows
+
+    def _fetch_range(self, model, start, end):
+        stmt = _rows(model).where(model.date >= start, model.date < end)
+        rows = self._all(stmt)
+        for engine in self._cold_engines(start, end):
+            rows += self._all(stmt, engine)
+        return rows
 
     # ─────────────────────────────
     # CATEGORY METHODS
     # ─────────────────────────────
     def get_expense_categories(self):
         """Get all unique expense categories"""
-        return [cat[0] for cat in self.session.query(Expense.category).distinct().all()]
+        return self._categories(Expense, "expense")
 
     def get_income_categories(self):
         """Get all unique income categories"""
-        return [cat[0] for cat in self.session.query(Income.category).distinct().all()]
+        return self._categories(Income, "income")
 
     def get_expenses_by_category(self, year=None, month=None):
         """Get expenses grouped by category"""
-        query = self.session.query(Expense)
-        if year and month:
-            start = datetime(year, month, 1).date()
-            if month == 12:
-                end = datetime(year + 1, 1, 1).date()
-            else:
-                end = datetime(year, month + 1, 1).date()
-            query = query.filter(Expense.date >= start, Expense.date < end)
-        
-        expenses = query.all()
-        categories = {}
-        for exp in expenses:
-            categories[exp.category] = categories.get(exp.category, 0) + exp.amount
-        return categories
+        return self._totals_by_category(Expense, "expense", year, month)
 
     def get_incomes_by_category(self, year=None, month=None):
         """Get incomes grouped by category"""
-        query = self.session.query(Income)
+        return self._totals_by_category(Income, "income", year, month)
+
+    def get_description_counts(self, kind):
+        """(description, category, count) for every distinct pair, used to seed autocomplete"""
+        model = MODELS[kind]
+        return self._all(
+            select(model.description, model.category, func.count())
+            .group_by(model.description, model.category)
+        )
+
+    def _categories(self, model, kind):
+        hot = [cat for (cat,) in self._all(select(model.category).distinct())]
+        archived = self._all(select(ArchiveRollup.category).where(ArchiveRollup.kind == kind).distinct())
+        return hot + [cat for (cat,) in archived if cat not in hot]
+
+    def _totals_by_category(self, model, kind, year, month):
+        # archived years are answered from their rollups, without opening the cold file
+        query = select(model.category, func.sum(model.amount)).group_by(model.category)
+        rollups = select(ArchiveRollup.category, ArchiveRollup.total).where(ArchiveRollup.kind == kind)
         if year and month:
-            start = datetime(year, month, 1).date()
-            if month == 12:
-                end = datetime(year + 1, 1, 1).date()
-            else:
-                end = datetime(year, month + 1, 1).date()
-            query = query.filter(Income.date >= start, Income.date < end)
-        
-        incomes = query.all()
-        categories = {}
-        for inc in incomes:
-            categories[inc.category] = categories.get(inc.category, 0) + inc.amount
+            start, end = month_range(year, month)
+            query = query.where(model.date >= start, model.date < end)
+            rollups = rollups.where(ArchiveRollup.year == year, ArchiveRollup.month == month)
+
+        categories = dict(self._all(query))
+        for category, total in self._all(rollups):
+            categories[category] = categories.get(category, 0) + total
         return categories
+
+    # ─────────────────────────────
+    # ARCHIVE METHODS
+    # ─────────────────────────────
+    def _archive_path(self, year):
+        stem = os.path.splitext(os.path.basename(self.db_path))[0]
+        return os.path.join(os.path.dirname(self.db_path), "archive", f"{stem}-{year}.db")
+
+    def get_archived_years(self):
+        """Archived years as {year: (expense_count, income_count)}"""
+        stmt = select(ArchivedYear.year, ArchivedYear.expense_count, ArchivedYear.income_count).order_by(ArchivedYear.year)
+        return {year: (expenses, incomes) for year, expenses, incomes in self._all(stmt)}
+
+    def archive_paths(self):
+        """Cold files of every archived year (what a backup must copy besides the ledger)"""
+        return [self._archive_path(year) for (year,) in self._all(select(ArchivedYear.year).order_by(ArchivedYear.year))]
+
+    def _cold_engines(self, start=None, end=None):
+        """Engines on the cold files overlapping [start, end), newest year first, opened on demand.
+
+        Files are found next to the ledger, so a ledger restored elsewhere
+        with its archive/ directory keeps working.
+        """
+        engines = []
+        for (year,) in self._all(select(ArchivedYear.year).order_by(ArchivedYear.year.desc())):
+            if start is not None and not (datetime(year, 1, 1).date() < end and datetime(year + 1, 1, 1).date() > start):
+                continue
+            path = self._archive_path(year)
+            if not os.path.exists(path):
+                # never let get_engine create an empty partition in its place
+                raise FileNotFoundError(f"Missing archive file for {year}: {path} (restore it from backups/archive/)")
+            engines.append(get_engine(path, tables=PARTITION_TABLES))
+        return engines
+
+    @_retry_on_lock
+    def archive_year(self, year):
+        """Move a closed year's transactions into its own cold file.
+
+        Monthly per-category rollups stay behind in the hot file so dashboards
+        and category totals never need to open the cold file. Archiving a year
+        again appends any rows added to it since. Returns (expenses, incomes)
+        moved; a year without transactions in the hot file is left alone.
+        """
+        if year >= datetime.now().year:
+            raise ValueError(f"{year} is not closed yet; only past years can be archived")
+        start, end = datetime(year, 1, 1).date().isoformat(), datetime(year + 1, 1, 1).date().isoformat()
+        if not any(self._scalar(select(model.id).where(model.date >= start, model.date < end).limit(1)) is not None
+                   for model in MODELS.values()):
+            return 0, 0  # nothing to move: no cold file, no archived_years row
+        path = self._archive_path(year)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        get_engine(path, tables=PARTITION_TABLES)
+
+        moved = {}
+        with self.engine.connect() as conn:
+            conn.exec_driver_sql("ATTACH DATABASE ? AS cold", (os.path.abspath(path),))
+            conn.commit()
+            try:
+                # write lock first (see _begin_immediate): the first statement reads main before writing to it
+                conn.exec_driver_sql("BEGIN IMMEDIATE")
+                params = {"start": start, "end": end}
+                for kind, model in (("expense", Expense), ("income", Income)):
+                    table = model.__tablename__
+                    in_year = f"FROM main.{table} WHERE date >= :start AND date < :end"
+                    # rows keep their ids, which the hot file never hands out again
+                    conn.execute(text(
+                        f"INSERT INTO cold.{table} (id, date, description, amount, category) "
+                        f"SELECT id, date, description, amount, category {in_year} ORDER BY date, id"
+                    ), params)
+                    conn.execute(text(
+                        "INSERT INTO main.archive_rollups (year, month, kind, category, total, count) "
+                        "SELECT CAST(strftime('%Y', date) AS INTEGER), CAST(strftime('%m', date) AS INTEGER), "
+                        f":kind, category, SUM(amount), COUNT(*) {in_year} GROUP BY 1, 2, 4 "
+                        "ON CONFLICT (year, month, kind, category) DO UPDATE "
+                        "SET total = total + excluded.total, count = count + excluded.count"
+                    ), {**params, "kind": kind})
+                    moved[kind] = conn.execute(text(f"DELETE {in_year}"), params).rowcount
+                conn.execute(text(
+                    "INSERT INTO main.archived_years (year, path, expense_count, income_count) "
+                    "VALUES (:year, :path, :expenses, :incomes) "
+                    "ON CONFLICT (year) DO UPDATE SET expense_count = expense_count + excluded.expense_count, "
+                    "income_count = income_count + excluded.income_count"
+                ), {"year": year, "path": path, "expenses": moved["expense"], "incomes": moved["income"]})
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                conn.exec_driver_sql("DETACH DATABASE cold")
+            # hand the freed pages back to the filesystem so the hot file shrinks;
+            # another process reading the ledger blocks this, and a later archive retries it
+            try:
+                conn.exec_driver_sql("VACUUM")
+            except OperationalError as e:
+                if not is_lock_error(e):
+                    raise
+
+        return moved["expense"], moved["income"]
+
+    # ─────────────────────────────
+    # BUDGET LIMITS
+    # ─────────────────────────────
+    @_retry_on_lock
+    def set_budget_limit(self, category, amount):
+        """Set (or replace) the monthly limit for a category"""
+        with self.Session.begin() as session:
+            session.merge(BudgetLimit(category=category, amount=amount))
+
+    @_retry_on_lock
+    def remove_budget_limit(self, category):
+        """Remove the monthly limit for a category"""
+        with self.Session.begin() as session:
+            limit = session.get(BudgetLimit, category)
+            if not limit:
+                return False
+            session.delete(limit)
+        return True
+
+    def get_budget_limits(self):
+        """Get all monthly limits as {category: amount}"""
+        return dict(self._all(select(BudgetLimit.category, BudgetLimit.amount)))
+
+    def check_budget(self, date, category):
+        """Limit status of one category for the month of `date`, or None if it has no limit.
+
+        Reads the limit and the spend counter by primary key, so it is constant time
+        and safe to call right after every add/update.
+        """
+        with self.engine.connect() as conn:
+            limit = conn.execute(select(BudgetLimit.amount).where(BudgetLimit.category == category)).scalar()
+            if limit is None:
+                return None
+            spent = conn.execute(select(CategorySpend.spent).where(
+                CategorySpend.year == date.year, CategorySpend.month == date.month, CategorySpend.category == category
+            )).scalar() or 0.0
+        return {"limit": limit, "spent": spent, "remaining": limit - spent}
+
+    def get_budget_status(self, year, month):
+        """Limit status of every limited category for a month"""
+        spent = dict(self._all(
+            select(CategorySpend.category, CategorySpend.spent)
+            .where(CategorySpend.year == year, CategorySpend.month == month)
+        ))
+        status = {}
+        for category, amount in self.get_budget_limits().items():
+            cat_spent = spent.get(category, 0.0)
+            status[category] = {"limit": amount, "spent": cat_spent, "remaining": amount - cat_spent}
+        return status
+
+    @_retry_on_lock
+    def reconcile_spending(self, fix=True):
+        """Verify the spend counters against the raw expenses.
+
+        Archived years are checked against their rollups.
+        Returns a list of (year, month, category, counter, actual) mismatches and,
+        when `fix` is set, rewrites the counters to the actual totals.
+        """
+        year = func.strftime("%Y", Expense.date)
+        month = func.strftime("%m", Expense.date)
+        with self.Session.begin() as session:
+            actual = {
+                (int(y), int(m), cat): total
+                for y, m, cat, total in session.execute(
+                    select(year, month, Expense.category, func.sum(Expense.amount))
+                    .group_by(year, month, Expense.category)
+                )
+            }
+            for r in session.scalars(select(ArchiveRollup).where(ArchiveRollup.kind == "expense")):
+                key = (r.year, r.month, r.category)
+                actual[key] = actual.get(key, 0.0) + r.total
+            counters = {(c.year, c.month, c.category): c for c in session.scalars(select(CategorySpend))}
+
+            mismatches = []
+            for key in set(actual) | set(counters):
+                expected = actual.get(key, 0.0)
+                counter = counters.get(key)
+                current = counter.spent if counter else 0.0
+                if abs(current - expected) > 0.005:
+                    mismatches.append((*key, current, expected))
+                if not fix:
+                    continue
+                if key not in actual:
+                    session.delete(counter)
+                elif counter is None:
+                    session.add(CategorySpend(year=key[0], month=key[1], category=key[2], spent=expected))
+                else:
+                    counter.spent = expected
+        return sorted(mismatches)
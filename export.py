@@ -0,0 +1,95 @@
+"""
+Streaming exports of a ledger to CSV, Parquet or Arrow IPC.
+
+Rows are pulled from the database in row-group-sized batches and written
+as they arrive. Parquet and Arrow need the optional pyarrow package; CSV
+always works.
+"""
+
+import csv
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+FORMATS = ("csv", "parquet", "arrow")
+ROW_GROUP_SIZE = 64_000
+
+if pa is not None:
+    SCHEMA = pa.schema([
+        ("date", pa.date32()),
+        ("description", pa.string()),
+        ("amount", pa.float64()),
+        ("category", pa.string()),
+    ])
+
+
+def columnar_available():
+    """Whether pyarrow is installed"""
+    return pa is not None
+
+
+def export_ledger(db, fmt="csv", start=None, end=None, categories=None, batch_size=ROW_GROUP_SIZE):
+    """Export expenses and incomes to <kind>s_export.<ext>.
+
+    Returns a list of (path, rows, size_in_bytes), one per file written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt} (choose from {', '.join(FORMATS)})")
+    if fmt != "csv" and pa is None:
+        raise ImportError("pyarrow is required for parquet/arrow export (pip install pyarrow)")
+
+    written = []
+    for kind in ("expense", "income"):
+        path = f"{kind}s_export.{fmt}"
+        batches = db.iter_batches(kind, start, end, categories, batch_size)
+        if fmt == "csv":
+            rows = _write_csv(path, batches)
+        elif fmt == "parquet":
+            rows = _write_parquet(path, batches)
+        else:
+            rows = _write_arrow(path, batches)
+        written.append((path, rows, os.path.getsize(path)))
+    return written
+
+
+def _write_csv(path, batches):
+    rows = 0
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["Date", "Description", "Amount", "Category"])
+        for batch in batches:
+            writer.writerows(batch)
+            rows += len(batch)
+    return rows
+
+
+def _record_batch(batch):
+    dates, descriptions, amounts, categories = zip(*batch)
+    return pa.record_batch(
+        [pa.array(dates, pa.date32()), pa.array(descriptions, pa.string()),
+         pa.array(amounts, pa.float64()), pa.array(categories, pa.string())],
+        schema=SCHEMA,
+    )
+
+
+def _write_parquet(path, batches):
+    rows = 0
+    with pq.ParquetWriter(path, SCHEMA, compression="zstd") as writer:
+        for batch in batches:
+            writer.write_batch(_record_batch(batch), row_group_size=len(batch))
+            rows += len(batch)
+    return rows
+
+
+def _write_arrow(path, batches):
+    rows = 0
+    options = pa.ipc.IpcWriteOptions(compression="zstd")
+    with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, SCHEMA, options=options) as writer:
+        for batch in batches:
+            writer.write_batch(_record_batch(batch))
+            rows += len(batch)
+    return rows
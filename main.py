@@ -4,11 +4,46 @@ Personal Budget Tracker TUI
 Entry point for the application
 """
 
+import argparse
+import asyncio
+import sys
+
+from db import DEFAULT_LEDGER, Database, ledger_path
 from tui import BudgetApp
 
+def show_migration_progress(version, name, done, total):
+    """Print batched ledger upgrades on one line while the terminal is still ours"""
+    print(f"\rUpgrading ledger ({name}): {done:,}/{total:,} rows", end="", file=sys.stderr, flush=True)
+    if done >= total:
+        print(file=sys.stderr)
+
 def main():
     """Launch the Budget Tracker TUI"""
-    app = BudgetApp()
+    parser = argparse.ArgumentParser(description="Personal Budget Tracker TUI")
+    parser.add_argument("-l", "--ledger", default=DEFAULT_LEDGER,
+                        help="ledger to open, e.g. personal, household, business (default: %(default)s)")
+    parser.add_argument("--backup-interval", type=float, metavar="MINUTES",
+                        help="back up the ledger in the background every MINUTES when it changed")
+    parser.add_argument("--busy-timeout", type=float, metavar="SECONDS",
+                        help="how long to wait for another process writing to the same ledger (default: 5)")
+    parser.add_argument("--serve", type=int, nargs="?", const=8765, metavar="PORT",
+                        help="serve a read-only JSON API over the ledger instead of the TUI (default port: 8765)")
+    parser.add_argument("--host", default="127.0.0.1", help="address for --serve (default: %(default)s)")
+    args = parser.parse_args()
+
+    # upgrade an older ledger file before the TUI takes over the screen
+    db = Database(ledger_path(args.ledger), progress=show_migration_progress, busy_timeout=args.busy_timeout)
+
+    if args.serve is not None:
+        from server import serve
+        try:
+            asyncio.run(serve(db, args.host, args.serve))
+        except KeyboardInterrupt:
+            pass
+        return
+    db.close()
+
+    app = BudgetApp(ledger=args.ledger, backup_interval=args.backup_interval, busy_timeout=args.busy_timeout)
     app.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,240 @@
+"""
+Read-only JSON API over a ledger for local tools (dashboards, shell prompts).
+
+    python main.py --serve 8765
+    curl -s localhost:8765/months/2025-01
+
+Endpoints (dates are YYYY-MM-DD and inclusive):
+    GET /                                       ledger info and endpoint list
+    GET /months/<YYYY-MM>                       month totals, categories and budget limits
+    GET /categories?kind=expense&from=&to=      category totals for any date range
+    GET /transactions?kind=expense&from=&to=&limit=50&offset=0
+
+Plain asyncio, no framework. Responses are cached per URL and stay valid
+until the ledger file's change counter moves, so a hit costs one stat and a
+4-byte read. Every response carries an ETag (a hash of the body); a request
+with a matching If-None-Match gets an empty 304.
+"""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import parse_qs, urlencode, urlsplit
+import asyncio
+import hashlib
+import json
+import logging
+
+from backup import change_marker
+
+logger = logging.getLogger(__name__)
+
+KINDS = ("expense", "income")
+MAX_PAGE = 500
+MAX_REQUEST_LINE = 8 * 1024
+REASONS = {200: "OK", 304: "Not Modified", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _date(query, name):
+    value = query.get(name)
+    if not value:
+        return None
+    try:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    except ValueError:
+        raise HttpError(400, f"{name} must be YYYY-MM-DD")
+
+
+def _kind(query):
+    kind = query.get("kind", "expense")
+    if kind not in KINDS:
+        raise HttpError(400, "kind must be expense or income")
+    return kind
+
+
+def _int(query, name, default, low, high):
+    try:
+        value = int(query.get(name, default))
+    except ValueError:
+        raise HttpError(400, f"{name} must be an integer")
+    return max(low, min(high, value))
+
+
+class ApiServer:
+    """HTTP/1.1 keep-alive server answering GETs from one Database"""
+
+    def __init__(self, db, cache_size=256):
+        self.db = db
+        self.cache_size = cache_size
+        self._cache = OrderedDict()  # target -> (marker, etag, body)
+        self.stats = {"requests": 0, "hits": 0, "misses": 0, "not_modified": 0}
+
+    async def start(self, host="127.0.0.1", port=8765):
+        return await asyncio.start_server(self._handle, host, port)
+
+    # ─────────────────────────────
+    # HTTP
+    # ─────────────────────────────
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                parts = request_line.decode("latin-1").split()
+                keep_alive = headers.get("connection", "").lower() != "close" and parts[-1:] == ["HTTP/1.1"]
+                if len(request_line) > MAX_REQUEST_LINE or len(parts) != 3:
+                    status, etag, body = 400, None, self._error_body("Malformed request line")
+                    keep_alive = False
+                elif parts[0] not in ("GET", "HEAD"):
+                    status, etag, body = 405, None, self._error_body("Read-only API: only GET is supported")
+                else:
+                    status, etag, body = await self.respond(parts[1], headers.get("if-none-match"))
+
+                head = [
+                    f"HTTP/1.1 {status} {REASONS[status]}",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(body)}",
+                    "Cache-Control: no-cache",
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}",
+                ]
+                if etag:
+                    head.append(f"ETag: {etag}")
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if parts[:1] != ["HEAD"]:
+                    writer.write(body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            pass  # client went away, or sent a line longer than the stream limit
+        finally:
+            writer.close()
+
+    async def respond(self, target, if_none_match=None):
+        """(status, etag, body) for one GET, from the cache when the ledger is unchanged"""
+        self.stats["requests"] += 1
+        marker = change_marker(self.db.db_path)
+        cached = self._cache.get(target)
+        if cached and cached[0] == marker:
+            self._cache.move_to_end(target)
+            self.stats["hits"] += 1
+            _, etag, body = cached
+        else:
+            self.stats["misses"] += 1
+            try:
+                payload = await asyncio.to_thread(self.route, target)
+            except HttpError as e:
+                return e.status, None, self._error_body(str(e))
+            except ValueError as e:  # e.g. a date outside what the range index holds
+                return 400, None, self._error_body(str(e))
+            except Exception:
+                logger.exception("Error answering %s", target)
+                return 500, None, self._error_body("Internal error")
+            body = json.dumps(payload, default=str).encode()
+            etag = '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+            if self.cache_size:
+                self._cache[target] = (marker, etag, body)
+                self._cache.move_to_end(target)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+            self.stats["not_modified"] += 1
+            return 304, etag, b""
+        return 200, etag, body
+
+    def _error_body(self, message):
+        return json.dumps({"error": message}).encode()
+
+    # ─────────────────────────────
+    # ROUTES
+    # ─────────────────────────────
+    # Called on a worker thread, so queries never block the event loop.
+    def route(self, target):
+        url = urlsplit(target)
+        query = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split("/") if p]
+
+        if not parts:
+            return self.index()
+        if parts[0] == "months" and len(parts) == 2:
+            try:
+                month = datetime.strptime(parts[1], "%Y-%m")
+            except ValueError:
+                raise HttpError(400, "month must be YYYY-MM")
+            return self.month(month.year, month.month)
+        if parts == ["categories"]:
+            return self.categories(query)
+        if parts == ["transactions"]:
+            return self.transactions(url.path, query)
+        raise HttpError(404, f"No such endpoint: {url.path}")
+
+    def index(self):
+        return {
+            "ledger": self.db.db_path,
+            "journal_head": self.db.journal_head(),
+            "endpoints": ["/months/<YYYY-MM>", "/categories", "/transactions"],
+        }
+
+    def month(self, year, month):
+        expenses = self.db.get_expenses_by_category(year, month)
+        incomes = self.db.get_incomes_by_category(year, month)
+        total_expenses, total_incomes = sum(expenses.values()), sum(incomes.values())
+        return {
+            "month": f"{year}-{month:02d}",
+            "income": round(total_incomes, 2),
+            "expenses": round(total_expenses, 2),
+            "balance": round(total_incomes - total_expenses, 2),
+            "expense_categories": {c: round(t, 2) for c, t in expenses.items()},
+            "income_categories": {c: round(t, 2) for c, t in incomes.items()},
+            "budget": self.db.get_budget_status(year, month),
+        }
+
+    def categories(self, query):
+        kind, start, end = _kind(query), _date(query, "from"), _date(query, "to")
+        totals = self.db.get_range_totals(kind, start, end + timedelta(days=1) if end else None)
+        return {
+            "kind": kind,
+            "from": start,
+            "to": end,
+            "total": round(sum(totals.values()), 2),
+            "categories": totals,
+        }
+
+    def transactions(self, path, query):
+        kind, start, end = _kind(query), _date(query, "from"), _date(query, "to")
+        limit = _int(query, "limit", 50, 1, MAX_PAGE)
+        offset = _int(query, "offset", 0, 0, 10**9)
+        rows = self.db.get_page(kind, start, end + timedelta(days=1) if end else None, limit + 1, offset)
+        more = len(rows) > limit
+        return {
+            "kind": kind,
+            "limit": limit,
+            "offset": offset,
+            "items": [row._asdict() for row in rows[:limit]],
+            "next": f"{path}?{urlencode({**query, 'offset': offset + limit})}" if more else None,
+        }
+
+
+async def serve(db, host="127.0.0.1", port=8765, cache_size=256):
+    """Run the API until cancelled"""
+    api = ApiServer(db, cache_size)
+    server = await api.start(host, port)
+    print(f"Serving {db.db_path} on http://{host}:{port} (Ctrl+C to stop)")
+    async with server:
+        await server.serve_forever()
@@ -0,0 +1,152 @@
+"""
+In-memory autocomplete and category prediction for the add forms.
+
+Built once from the ledger at startup (one grouped query per kind) and
+updated incrementally on every add, so suggestions never touch the database.
+"""
+
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+import math
+import re
+
+from textual.suggester import Suggester
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokens(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+class PrefixIndex:
+    """Sorted casefolded keys searched by bisect; the most frequent completion wins"""
+
+    # candidates inspected per lookup, which keeps very short prefixes sub-millisecond
+    SCAN_LIMIT = 256
+
+    def __init__(self):
+        self._keys = []
+        self._counts = {}
+        self._display = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, value, count=1):
+        value = value.strip()
+        if not value:
+            return
+        key = value.casefold()
+        if key not in self._counts:
+            insort(self._keys, key)
+            self._counts[key] = 0
+            self._display[key] = value
+        self._counts[key] += count
+
+    def add_many(self, items):
+        """Bulk load (value, count) pairs, sorting the keys once; `add` is for one key at a time"""
+        for value, count in items:
+            value = value.strip()
+            if not value:
+                continue
+            key = value.casefold()
+            if key not in self._counts:
+                self._keys.append(key)
+                self._counts[key] = 0
+                self._display[key] = value
+            self._counts[key] += count
+        self._keys.sort()
+
+    def complete(self, prefix, limit=1):
+        """Up to `limit` known values starting with `prefix`, most used first"""
+        prefix = prefix.casefold()
+        if not prefix:
+            return []
+        start = bisect_left(self._keys, prefix)
+        candidates = []
+        for key in self._keys[start:start + self.SCAN_LIMIT]:
+            if not key.startswith(prefix):
+                break
+            candidates.append(key)
+        candidates.sort(key=lambda k: -self._counts[k])
+        return [self._display[k] for k in candidates[:limit]]
+
+    def most_common(self, n):
+        return [self._display[k] for k in sorted(self._keys, key=lambda k: -self._counts[k])[:n]]
+
+
+class CategoryModel:
+    """Multinomial naive Bayes over description tokens"""
+
+    def __init__(self):
+        self._token_counts = defaultdict(Counter)  # category -> token -> count
+        self._token_totals = Counter()             # category -> tokens seen
+        self._docs = Counter()                     # category -> descriptions seen
+        self._vocabulary = set()
+
+    def learn(self, description, category, count=1):
+        words = tokens(description)
+        self._docs[category] += count
+        for word in words:
+            self._token_counts[category][word] += count
+            self._token_totals[category] += count
+            self._vocabulary.add(word)
+
+    def predict(self, description):
+        """Most likely category for a description, or None without any known token"""
+        words = [w for w in tokens(description) if w in self._vocabulary]
+        if not words or not self._docs:
+            return None
+        total_docs = sum(self._docs.values())
+        vocabulary = len(self._vocabulary)
+        best, best_score = None, -math.inf
+        for category, docs in self._docs.items():
+            counts, total = self._token_counts[category], self._token_totals[category]
+            score = math.log(docs / total_docs)
+            for word in words:
+                score += math.log((counts[word] + 1) / (total + vocabulary))
+            if score > best_score:
+                best, best_score = category, score
+        return best
+
+
+class Autocomplete:
+    """Description/category indexes and category model for one kind of transaction"""
+
+    def __init__(self, default_categories=()):
+        self.descriptions = PrefixIndex()
+        self.categories = PrefixIndex()
+        self.model = CategoryModel()
+        for category in default_categories:
+            self.categories.add(category, count=0)
+
+    @classmethod
+    def from_db(cls, db, kind, default_categories=()):
+        index = cls(default_categories)
+        rows = db.get_description_counts(kind)
+        index.descriptions.add_many((description, count) for description, _, count in rows)
+        index.categories.add_many((category, count) for _, category, count in rows)
+        for description, category, count in rows:
+            index.model.learn(description, category, count)
+        return index
+
+    def learn(self, description, category, count=1):
+        self.descriptions.add(description, count)
+        self.categories.add(category, count)
+        self.model.learn(description, category, count)
+
+    def common_categories(self, n=8):
+        return self.categories.most_common(n)
+
+
+class IndexSuggester(Suggester):
+    """Textual suggester backed by a PrefixIndex (no cache: the index keeps learning)"""
+
+    def __init__(self, index):
+        super().__init__(use_cache=False)
+        self.index = index
+
+    async def get_suggestion(self, value):
+        matches = self.index.complete(value)
+        return matches[0] if matches else None
@@ -3,14 +3,28 @@ from textual.containers import Container, Horizontal, Vertical
 from textual.widgets import Header, Footer, Static, DataTable, Button, Input, Label, RichLog, ProgressBar
 from textual.binding import Binding
 from textual.screen import Screen
-from datetime import datetime
-from db import Database
+from textual.worker import get_current_worker
+from rich.markup import escape
+from rich.text import Text
+from collections import deque
+from datetime import datetime, timedelta
+from backup import BackupManager
+from db import Database, DEFAULT_LEDGER, consolidated_report, fingerprint, ledger_path, list_ledgers
+from export import columnar_available, export_ledger
+from suggest import Autocomplete, IndexSuggester
 import subprocess
 import matplotlib.pyplot as plt
 import seaborn as sns
 import tempfile
+import asyncio
+import csv
+import json
 import os
+import re
+import shlex
+import signal
 import sys
+import time
 
 # Add after imports
 EXPENSE_CATEGORIES = ["Food", "Transport", "Housing", "Entertainment", "Kids", "Healthcare", "Shopping", "Other"]
@@ -23,6 +37,11 @@ class AddExpenseScreen(Screen):
     """Screen for adding a new expense"""
     BINDINGS = [("escape", "app.pop_screen", "Back")]
 
+    # fingerprint of a possible duplicate the user was warned about; adding it again confirms
+    confirmed_duplicate = None
+    # category last filled in from the description, replaced as the description changes
+    predicted_category = None
+
     def compose(self) -> ComposeResult:
         yield Header()
         with Container(id="add-form"):
@@ -30,16 +49,28 @@ class AddExpenseScreen(Screen):
             yield Label("Date (YYYY-MM-DD):")
             yield Input(placeholder="2025-01-15", id="expense-date", value=datetime.now().strftime("%Y-%m-%d"))
             yield Label("Description:")
-            yield Input(placeholder="Groceries", id="expense-desc")
+            yield Input(placeholder="Groceries", id="expense-desc",
+                        suggester=IndexSuggester(self.app.autocomplete["expense"].descriptions))
             yield Label("Amount:")
             yield Input(placeholder="50.00", id="expense-amount")
             yield Label("Category:")
-            yield Input(placeholder="Food", id="expense-category")
-            yield Static("[dim]Common: Food, Transport, Housing, Entertainment, Healthcare, Shopping, Other[/]", id="category-hint")
+            yield Input(placeholder="Food", id="expense-category",
+                        suggester=IndexSuggester(self.app.autocomplete["expense"].categories))
+            common = ", ".join(self.app.autocomplete["expense"].common_categories())
+            yield Static(f"[dim]Common: {escape(common)}[/]", id="category-hint")
             yield Button("Add Expense", variant="success", id="submit-expense")
             yield Label("", id="expense-message")
         yield Footer()
 
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if event.input.id != "expense-desc":
+            return
+        category = self.query_one("#expense-category", Input)
+        if category.value and category.value != self.predicted_category:
+            return  # typed by the user, leave it alone
+        self.predicted_category = self.app.autocomplete["expense"].model.predict(event.value)
+        category.value = self.predicted_category or ""
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "submit-expense":
             try:
@@ -54,7 +85,19 @@ class AddExpenseScreen(Screen):
 
                 amount = float(amount_str)
                 date = datetime.strptime(date_str, "%Y-%m-%d").date()
+                duplicate = self.app.db.find_duplicate("expense", date, amount, desc)
+                key = fingerprint("expense", date, amount, desc)
+                if duplicate and self.confirmed_duplicate != key:
+                    self.confirmed_duplicate = key
+                    self.query_one("#expense-message", Label).update(
+                        f"⚠ Looks like a duplicate of #{duplicate.id} ({duplicate.date} {duplicate.description} "
+                        f"${duplicate.amount:.2f}). Press Add again to save it anyway."
+                    )
+                    return
+                self.confirmed_duplicate = None
                 self.app.db.add_expense(date, desc, amount, category)
+                self.app.autocomplete["expense"].learn(desc, category)
+                self.app.notify_budget(date, category)
 
                 self.query_one("#expense-message", Label).update("✓ Expense added successfully!")
                 self.query_one("#expense-date", Input).value = datetime.now().strftime("%Y-%m-%d")
@@ -76,6 +119,11 @@ class AddIncomeScreen(Screen):
     """Screen for adding a new income"""
     BINDINGS = [("escape", "app.pop_screen", "Back")]
 
+    # fingerprint of a possible duplicate the user was warned about; adding it again confirms
+    confirmed_duplicate = None
+    # category last filled in from the description, replaced as the description changes
+    predicted_category = None
+
     def compose(self) -> ComposeResult:
         yield Header()
         with Container(id="add-form"):
@@ -83,16 +131,28 @@ class AddIncomeScreen(Screen):
             yield Label("Date (YYYY-MM-DD):")
             yield Input(placeholder="2025-01-15", id="income-date", value=datetime.now().strftime("%Y-%m-%d"))
             yield Label("Description:")
-            yield Input(placeholder="Salary", id="income-desc")
+            yield Input(placeholder="Salary", id="income-desc",
+                        suggester=IndexSuggester(self.app.autocomplete["income"].descriptions))
             yield Label("Amount:")
             yield Input(placeholder="3000.00", id="income-amount")
             yield Label("Category:")
-            yield Input(placeholder="Salary", id="income-category")
-            yield Static("[dim]Common: Salary, Freelance, Investment, Gift, Bonus, Other[/]", id="category-hint")
+            yield Input(placeholder="Salary", id="income-category",
+                        suggester=IndexSuggester(self.app.autocomplete["income"].categories))
+            common = ", ".join(self.app.autocomplete["income"].common_categories())
+            yield Static(f"[dim]Common: {escape(common)}[/]", id="category-hint")
             yield Button("Add Income", variant="success", id="submit-income")
             yield Label("", id="income-message")
         yield Footer()
 
+    def on_input_changed(self, event: Input.Changed) -> None:
+        if event.input.id != "income-desc":
+            return
+        category = self.query_one("#income-category", Input)
+        if category.value and category.value != self.predicted_category:
+            return  # typed by the user, leave it alone
+        self.predicted_category = self.app.autocomplete["income"].model.predict(event.value)
+        category.value = self.predicted_category or ""
+
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "submit-income":
             try:
@@ -107,7 +167,18 @@ class AddIncomeScreen(Screen):
 
                 amount = float(amount_str)
                 date = datetime.strptime(date_str, "%Y-%m-%d").date()
+                duplicate = self.app.db.find_duplicate("income", date, amount, desc)
+                key = fingerprint("income", date, amount, desc)
+                if duplicate and self.confirmed_duplicate != key:
+                    self.confirmed_duplicate = key
+                    self.query_one("#income-message", Label).update(
+                        f"⚠ Looks like a duplicate of #{duplicate.id} ({duplicate.date} {duplicate.description} "
+                        f"${duplicate.amount:.2f}). Press Add again to save it anyway."
+                    )
+                    return
+                self.confirmed_duplicate = None
                 self.app.db.add_income(date, desc, amount, category)
+                self.app.autocomplete["income"].learn(desc, category)
 
                 self.query_one("#income-message", Label).update("✓ Income added successfully!")
                 self.query_one("#income-date", Input).value = datetime.now().strftime("%Y-%m-%d")
@@ -154,7 +225,7 @@ class EditExpenseScreen(Screen):
             try:
                 date_str = self.query_one("#edit-date", Input).value
                 date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                expenses = self.app.db.session.query(self.app.db.Expense).filter_by(date=date).all()
+                expenses = self.app.db.get_expenses_on(date)
 
                 table.clear(columns=True)
                 table.add_columns("ID", "Date", "Description", "Amount", "Category")
@@ -194,6 +265,8 @@ class EditExpenseScreen(Screen):
                 )
                 if updated:
                     msg.update("✓ Expense updated successfully.")
+                    exp = self.app.db.get_expense(expense_id)
+                    self.app.notify_budget(exp.date, exp.category)
                     self.app.refresh_data()
                     # Clear inputs
                     self.query_one("#new-date", Input).value = ""
@@ -235,7 +308,7 @@ class EditIncomeScreen(Screen):
             try:
                 date_str = self.query_one("#edit-date", Input).value
                 date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                incomes = self.app.db.session.query(self.app.db.Income).filter_by(date=date).all()
+                incomes = self.app.db.get_incomes_on(date)
 
                 table.clear(columns=True)
                 table.add_columns("ID", "Date", "Description", "Amount", "Category")
@@ -315,7 +388,7 @@ class DeleteExpenseScreen(Screen):
             try:
                 date_str = self.query_one("#delete-date", Input).value
                 date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                expenses = self.app.db.session.query(self.app.db.Expense).filter_by(date=date).all()
+                expenses = self.app.db.get_expenses_on(date)
 
                 table.clear(columns=True)
                 table.add_columns("ID", "Date", "Description", "Amount", "Category")
@@ -376,7 +449,7 @@ class DeleteIncomeScreen(Screen):
             try:
                 date_str = self.query_one("#delete-date", Input).value
                 date = datetime.strptime(date_str, "%Y-%m-%d").date()
-                incomes = self.app.db.session.query(self.app.db.Income).filter_by(date=date).all()
+                incomes = self.app.db.get_incomes_on(date)
 
                 table.clear(columns=True)
                 table.add_columns("ID", "Date", "Description", "Amount", "Category")
@@ -416,8 +489,22 @@ class DeleteIncomeScreen(Screen):
 # Command Screen
 # ─────────────────────────────────────────────
 class CommandScreen(Screen):
-    """Screen for running commands and scripts"""
-    BINDINGS = [("escape", "app.pop_screen", "Back")]
+    """Screen for running commands and scripts.
+
+    Installed once on the app, so leaving it keeps its log; jobs are app
+    workers and keep running (and writing to the log) while it is hidden.
+    """
+    BINDINGS = [
+        ("escape", "back", "Back"),
+        Binding("ctrl+x", "cancel_job", "Cancel Job"),
+    ]
+
+    # keep a chatty script from growing the log (or a single line) without bound
+    MAX_OUTPUT_LINES = 2000
+    MAX_LINE_BYTES = 16 * 1024
+    # job output is written to the log at most this often, this many lines per write
+    FLUSH_INTERVAL = 0.1
+    WRITE_SLICE = 100
 
     def compose(self) -> ComposeResult:
         yield Header()
@@ -427,7 +514,7 @@ class CommandScreen(Screen):
             yield Input(placeholder="python my_script.py or ls", id="command-input")
             yield Button("Execute", variant="success", id="btn-execute")
             yield Label("\nOutput:", id="output-label")
-            yield RichLog(id="command-output", highlight=True, markup=True)
+            yield RichLog(id="command-output", highlight=True, markup=True, max_lines=self.MAX_OUTPUT_LINES)
         yield Footer()
 
     def on_mount(self) -> None:
@@ -435,9 +522,15 @@ class CommandScreen(Screen):
         output.write("[dim]Available built-in commands:[/]")
         output.write("  • help - Show available commands")
         output.write("  • stats - Show database statistics")
-        output.write("  • export - Export data to CSV")
+        output.write("  • export - Export data to CSV, Parquet or Arrow")
+        output.write("  • budget - Show or set monthly category limits")
+        output.write("  • ledger - List or switch ledgers")
+        output.write("  • archive - Move closed years to cold files")
+        output.write("  • backup - Back up the ledger in the background")
+        output.write("  • import / dedupe - Import CSV without duplicates, list duplicates")
         output.write("  • clear - Clear this output")
-        output.write("\n[dim]Or run any Python script or shell command[/]")
+        output.write("  • jobs - List running shell commands")
+        output.write("\n[dim]Or run any Python script or shell command (Ctrl+X cancels the latest)[/]")
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "btn-execute":
@@ -461,8 +554,26 @@ class CommandScreen(Screen):
                 output.write("[green]Built-in commands:[/]")
                 output.write("  help   - Show this help")
                 output.write("  stats  - Show database statistics")
-                output.write("  export - Export data to CSV")
+                output.write("  export [--format csv|parquet|arrow] [--from YYYY-MM-DD] [--to YYYY-MM-DD] [--category C ...]")
+                output.write("         - Export transactions (parquet/arrow need pyarrow)")
+                output.write("  export --since <seq> - Export only journal changes after <seq> (JSON lines)")
                 output.write("  plot   - Generate category pie charts")
+                output.write("  budget - Show this month's category limits")
+                output.write("  budget set <category> <amount> - Set a monthly limit")
+                output.write("  budget rm <category> - Remove a monthly limit")
+                output.write("  reconcile - Verify budget counters and rebuild the range index")
+                output.write("  ledger - List ledgers")
+                output.write("  ledger <name> - Switch to (or create) a ledger")
+                output.write("  range <from> <to> | range --days N - Show totals for a custom date range on the dashboard")
+                output.write("  range clear - Hide the custom range")
+                output.write("  report [ledger ...|all] [YYYY-MM] - Consolidated totals across ledgers")
+                output.write("  archive - List archived years")
+                output.write("  archive <year> - Move a closed year into its own cold file")
+                output.write("  backup [--force] - Online backup of the ledger if it changed")
+                output.write("  import expenses|incomes <file.csv> [--keep-duplicates] - Import an exported-format CSV")
+                output.write("  dedupe [expenses|incomes] - List groups of duplicate transactions")
+                output.write("  jobs   - List running shell commands")
+                output.write("  kill <id> - Cancel a running shell command (Ctrl+X cancels the latest)")
                 output.write("  clear  - Clear output")
 
             elif command == "clear":
@@ -480,37 +591,433 @@ class CommandScreen(Screen):
                 monthly_inc = self.app.db.get_monthly_incomes(now.year, now.month)
                 output.write(f"[yellow]This month - Expenses: {len(monthly_exp)}, Incomes: {len(monthly_inc)}[/]")
 
-            elif command == "export":
-                expenses = self.app.db.get_expenses()
-                incomes = self.app.db.get_incomes()
-                with open("expenses_export.csv", "w") as f:
-                    f.write("Date,Description,Amount,Category\n")
-                    for exp in expenses:
-                        f.write(f"{exp.date},{exp.description},{exp.amount},{exp.category}\n")
-                with open("incomes_export.csv", "w") as f:
-                    f.write("Date,Description,Amount,Category\n")
-                    for inc in incomes:
-                        f.write(f"{inc.date},{inc.description},{inc.amount},{inc.category}\n")
-                output.write("[green]✓ Exported to expenses_export.csv and incomes_export.csv[/]")
+                if self.app.db.lock_retries:
+                    output.write(f"[yellow]Writes retried after lock contention: {self.app.db.lock_retries}[/]")
+
+                latencies = sorted(self.app.nav_latencies)
+                if latencies:
+                    output.write(
+                        f"[dim]Month navigation, last keypress to dashboard: "
+                        f"last {self.app.nav_latencies[-1] * 1000:.0f} ms, "
+                        f"median {latencies[len(latencies) // 2] * 1000:.0f} ms "
+                        f"over {len(latencies)} navigation(s)[/]"
+                    )
+
+            elif command.startswith("export --since"):
+                args = command.split()[2:]
+                if len(args) != 1 or not args[0].isdigit():
+                    output.write("[red]Usage: export --since <seq> (0 exports every change)[/]")
+                else:
+                    since = int(args[0])
+                    path = f"changes_since_{since}.jsonl"
+                    head, count = since, 0
+                    with open(path, "w") as f:
+                        for change in self.app.db.changes_since(since):
+                            f.write(json.dumps(change) + "\n")
+                            head, count = change["seq"], count + 1
+                    output.write(f"[green]✓ Exported {count} change(s) to {path}[/]")
+                    output.write(f"[dim]Next checkpoint: export --since {head}[/]")
+
+            elif command == "export" or command.startswith("export "):
+                self.run_export_command(shlex.split(command)[1:], output)
 
             elif command == "plot":
                 self.generate_pie_charts(output)
 
+            elif command == "budget" or command.startswith("budget "):
+                self.run_budget_command(command.split()[1:], output)
+
+            elif command == "ledger":
+                for name in list_ledgers() or [self.app.ledger]:
+                    marker = "[bold green]*[/]" if name == self.app.ledger else " "
+                    output.write(f"{marker} {name} ({ledger_path(name)})")
+
+            elif command.startswith("ledger "):
+                name = command.split(maxsplit=1)[1].strip()
+                output.write(f"[dim]Opening ledger '{name}'...[/]")
+                self.app.run_worker(lambda: self.open_ledger(name, output), thread=True, group="ledger", exclusive=True)
+
+            elif command == "range" or command.startswith("range "):
+                self.run_range_command(command.split()[1:], output)
+
+            elif command == "report" or command.startswith("report "):
+                self.run_report_command(command.split()[1:], output)
+
+            elif command == "archive":
+                archived = self.app.db.get_archived_years()
+                if not archived:
+                    output.write("[yellow]No archived years[/]")
+                for year, (expenses, incomes) in archived.items():
+                    output.write(f"  {year}: {expenses} expense(s), {incomes} income(s)")
+
+            elif command.startswith("archive "):
+                year = int(command.split()[1])
+                expenses, incomes = self.app.db.archive_year(year)
+                if not expenses and not incomes:
+                    output.write(f"[yellow]No transactions in {year} to archive[/]")
+                else:
+                    output.write(f"[green]✓ Archived {year}: moved {expenses} expense(s) and {incomes} income(s)[/]")
+                self.app.refresh_data()
+
+            elif command in ("backup", "backup --force"):
+                output.write("[dim]Backing up in the background...[/]")
+                self.app.run_worker(lambda: self.run_backup(output, command.endswith("--force")), thread=True, group="backup")
+
+            elif command.startswith("import "):
+                self.run_import_command(shlex.split(command)[1:], output)
+
+            elif command == "dedupe" or command.startswith("dedupe "):
+                kinds = command.split()[1:] or ["expenses", "incomes"]
+                for kind in kinds:
+                    groups = self.app.db.find_duplicate_groups(kind.rstrip("s"))
+                    output.write(f"[bold]{kind.capitalize()}: {len(groups)} duplicate group(s)[/]")
+                    for group in groups:
+                        first = group[0]
+                        ids = ", ".join(f"#{row.id}" for row in group)
+                        output.write(f"  {first.date} {escape(first.description)} ${first.amount:.2f} → {ids}")
+
+            elif command == "reconcile":
+                mismatches = self.app.db.reconcile_spending()
+                if not mismatches:
+                    output.write("[green]✓ Budget counters match transactions[/]")
+                else:
+                    for year, month, category, counter, actual in mismatches:
+                        output.write(f"[yellow]{year}-{month:02d} {escape(category)}: counter ${counter:,.2f}, actual ${actual:,.2f}[/]")
+                    output.write(f"[green]✓ Repaired {len(mismatches)} counter(s)[/]")
+                skipped = self.app.db.rebuild_range_index()
+                for kind, day, category, total in skipped:
+                    output.write(f"[yellow]{day} {escape(category)} {kind} ${total:,.2f}: date outside 1900-2258, left out of range totals[/]")
+                output.write("[green]✓ Rebuilt the range index[/]")
+                self.app.refresh_data()
+
+            elif command == "jobs":
+                if not self.app.jobs:
+                    output.write("[dim]No running jobs[/]")
+                for job_id, job in self.app.jobs.items():
+                    elapsed = time.monotonic() - job["started"]
+                    output.write(f"  [{job_id}] {escape(job['command'])} ({elapsed:.0f}s)")
+
+            elif command.startswith("kill "):
+                job_id = int(command.split()[1].lstrip("%"))
+                if job_id not in self.app.jobs:
+                    output.write(f"[yellow]No running job {job_id}[/]")
+                else:
+                    self.app.jobs[job_id]["worker"].cancel()
+
             else:
-                result = subprocess.run(command, shell=True, capture_output=True, text=True, timeout=30)
-                if result.stdout:
-                    output.write(result.stdout)
-                if result.stderr:
-                    output.write(f"[red]{result.stderr}[/]")
-                output.write("[green]✓ Command completed successfully[/]" if result.returncode == 0 else f"[red]Exit code: {result.returncode}[/]")
-
-        except subprocess.TimeoutExpired:
-            output.write("[red]✗ Command timed out (30s limit)[/]")
+                self.start_job(command, output)
+
         except Exception as e:
             output.write(f"[red]✗ Error: {str(e)}[/]")
 
         self.query_one("#command-input", Input).value = ""
 
+    # ─────────────────────────────
+    # SHELL JOBS
+    # ─────────────────────────────
+    def start_job(self, command, output) -> None:
+        """Run a shell command as a background job, streaming its output into the log"""
+        self.app.last_job += 1
+        job_id = self.app.last_job
+        jobs = self.app.jobs
+        jobs[job_id] = {"command": command, "started": time.monotonic()}
+        jobs[job_id]["worker"] = self.app.run_worker(
+            self.run_job(job_id, command, output), group="jobs", exit_on_error=False
+        )
+        output.write(f"[dim][{job_id}] started[/]")
+
+    async def run_job(self, job_id, command, output) -> None:
+        process = await asyncio.create_subprocess_shell(
+            command,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            start_new_session=os.name == "posix",
+        )
+        try:
+            await asyncio.gather(
+                self.stream_lines(job_id, process.stdout, output),
+                self.stream_lines(job_id, process.stderr, output, style="red"),
+            )
+            code = await process.wait()
+            if code == 0:
+                output.write(f"[green]✓ [{job_id}] Command completed successfully[/]")
+            else:
+                output.write(f"[red][{job_id}] Exit code: {code}[/]")
+        except asyncio.CancelledError:
+            self.terminate(process)
+            output.write(f"[yellow][{job_id}] Cancelled[/]")
+            raise
+        except Exception as e:
+            output.write(f"[red]✗ [{job_id}] Error: {escape(str(e))}[/]")
+        finally:
+            self.app.jobs.pop(job_id, None)
+
+    async def stream_lines(self, job_id, stream, output, style=None) -> None:
+        """Write a pipe to the log, cutting lines at MAX_LINE_BYTES.
+
+        Lines are buffered and written every FLUSH_INTERVAL, WRITE_SLICE at a
+        time with a yield in between, so a chatty job never holds the event
+        loop for long. Lines the log would drop anyway are never rendered.
+        """
+        prefix = f"[dim][{job_id}][/] " if len(self.app.jobs) > 1 else ""
+        buffered = deque(maxlen=self.MAX_OUTPUT_LINES)
+
+        def add(line, truncated=False):
+            text = escape(line.decode(errors="replace").rstrip("\r"))
+            if truncated:
+                text += " [dim]… (truncated)[/]"
+            buffered.append(f"{prefix}[{style}]{text}[/]" if style else f"{prefix}{text}")
+
+        async def flush():
+            while buffered:
+                lines = [buffered.popleft() for _ in range(min(self.WRITE_SLICE, len(buffered)))]
+                # a Text, so job output skips the log's highlighter
+                output.write(Text.from_markup("\n".join(lines)))
+                await asyncio.sleep(0)
+
+        pending, skipping = b"", False
+        flushed = time.monotonic()
+        while True:
+            try:
+                # a quiet pipe shows what is buffered without waiting for more
+                chunk = await asyncio.wait_for(stream.read(self.MAX_LINE_BYTES), self.FLUSH_INTERVAL if buffered else None)
+            except asyncio.TimeoutError:
+                await flush()
+                flushed = time.monotonic()
+                continue
+            if not chunk:
+                break
+            if skipping:
+                # drop the rest of an overlong line up to its newline
+                newline = chunk.find(b"\n")
+                if newline < 0:
+                    continue
+                add(pending, truncated=True)
+                pending, skipping, chunk = b"", False, chunk[newline + 1:]
+            *lines, pending = (pending + chunk).split(b"\n")
+            for line in lines:
+                add(line)
+            if len(pending) > self.MAX_LINE_BYTES:
+                pending, skipping = pending[:self.MAX_LINE_BYTES], True
+            if time.monotonic() - flushed >= self.FLUSH_INTERVAL:
+                await flush()
+                flushed = time.monotonic()
+            else:
+                await asyncio.sleep(0)
+        if pending:
+            add(pending, truncated=skipping)
+        await flush()
+
+    @staticmethod
+    def terminate(process) -> None:
+        """Stop a job's whole process group, not just the shell"""
+        if process.returncode is not None:
+            return
+        try:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGTERM)
+            else:
+                process.terminate()
+        except ProcessLookupError:
+            pass
+
+    def action_cancel_job(self) -> None:
+        if not self.app.jobs:
+            self.notify("No running jobs", severity="warning")
+            return
+        self.app.jobs[max(self.app.jobs)]["worker"].cancel()
+
+    def action_back(self) -> None:
+        if self.app.jobs:
+            self.notify(f"{len(self.app.jobs)} job(s) still running; press c to follow them")
+        self.app.pop_screen()
+
+    def run_budget_command(self, args, output):
+        """Handle `budget`, `budget set <category> <amount>` and `budget rm <category>`"""
+        db = self.app.db
+        if not args:
+            status = db.get_budget_status(self.app.current_year, self.app.current_month)
+            if not status:
+                output.write("[yellow]No budget limits set. Use: budget set <category> <amount>[/]")
+            for category, s in sorted(status.items()):
+                color = "red" if s["remaining"] < 0 else "green"
+                output.write(f"[{color}]{escape(category)}: ${s['spent']:,.2f} / ${s['limit']:,.2f} (${s['remaining']:,.2f} left)[/]")
+        elif args[0] == "set" and len(args) >= 3:
+            category, amount = " ".join(args[1:-1]), float(args[-1])
+            db.set_budget_limit(category, amount)
+            output.write(f"[green]✓ {escape(category)} limited to ${amount:,.2f} per month[/]")
+            self.app.refresh_data()
+        elif args[0] == "rm" and len(args) >= 2:
+            category = " ".join(args[1:])
+            if db.remove_budget_limit(category):
+                output.write(f"[green]✓ Removed limit for {escape(category)}[/]")
+                self.app.refresh_data()
+            else:
+                output.write(f"[yellow]No limit set for {escape(category)}[/]")
+        else:
+            output.write("[red]Usage: budget | budget set <category> <amount> | budget rm <category>[/]")
+
+    def run_export_command(self, args, output):
+        """Handle `export [--format F] [--from D] [--to D] [--category C ...]`"""
+        fmt, start, end, categories = "csv", None, None, []
+        options = iter(args)
+        for option in options:
+            value = next(options, None)
+            if value is None:
+                raise ValueError(f"{option} needs a value")
+            if option == "--format":
+                fmt = value.lower()
+            elif option == "--from":
+                start = datetime.strptime(value, "%Y-%m-%d").date()
+            elif option == "--to":
+                end = datetime.strptime(value, "%Y-%m-%d").date() + timedelta(days=1)
+            elif option == "--category":
+                categories.append(value)
+            else:
+                raise ValueError(f"Unknown export option: {option}")
+
+        if fmt != "csv" and not columnar_available():
+            output.write("[red]✗ parquet/arrow export needs pyarrow[/]")
+            output.write("[yellow]Run: pip install pyarrow (CSV export still works)[/]")
+            return
+
+        started = time.perf_counter()
+        written = export_ledger(self.app.db, fmt, start, end, categories)
+        elapsed = time.perf_counter() - started
+        for path, rows, size in written:
+            output.write(f"[green]✓ {path}: {rows} row(s), {size / 1024:,.1f} KiB[/]")
+        output.write(f"[dim]Exported in {elapsed:.2f}s[/]")
+
+    def run_import_command(self, args, output):
+        """Handle `import expenses|incomes <file.csv> [--keep-duplicates]`"""
+        keep = "--keep-duplicates" in args
+        args = [a for a in args if a != "--keep-duplicates"]
+        if len(args) != 2 or args[0] not in ("expenses", "incomes"):
+            output.write("[red]Usage: import expenses|incomes <file.csv> [--keep-duplicates][/]")
+            return
+        kind, path = args[0].rstrip("s"), args[1]
+
+        rows = []
+        with open(path, newline="") as f:
+            for record in csv.DictReader(f):
+                rows.append((
+                    datetime.strptime(record["Date"], "%Y-%m-%d").date(),
+                    record["Description"],
+                    float(record["Amount"]),
+                    record.get("Category") or ("Other" if kind == "expense" else "Salary"),
+                ))
+
+        imported, duplicates = self.app.db.import_rows(kind, rows, skip_duplicates=not keep)
+        if imported:
+            self.app.load_autocomplete()
+        output.write(f"[green]✓ Imported {imported} of {len(rows)} {kind}(s) from {path}[/]")
+        if duplicates:
+            action = "imported anyway" if keep else "skipped"
+            output.write(f"[yellow]{len(duplicates)} duplicate(s) {action}:[/]")
+            for d, desc, amount, category in duplicates[:20]:
+                output.write(f"  {d} {escape(desc)} ${amount:.2f} {category}")
+            if len(duplicates) > 20:
+                output.write(f"  … and {len(duplicates) - 20} more")
+        self.app.refresh_data()
+
+    def open_ledger(self, name, output):
+        """Worker-thread body of `ledger <name>`: an older file is upgraded here, with its progress in the log"""
+        last = 0.0
+
+        def progress(version, migration, done, total):
+            nonlocal last
+            if done >= total or time.monotonic() - last >= 1:
+                last = time.monotonic()
+                self.app.call_from_thread(output.write, f"[dim]Upgrading ledger ({migration}): {done:,}/{total:,} rows[/]")
+
+        try:
+            db = Database(ledger_path(name), progress=progress, busy_timeout=self.app.busy_timeout)
+            autocomplete = self.app.build_autocomplete(db)
+        except Exception as e:
+            self.app.call_from_thread(output.write, f"[red]✗ Could not open ledger '{escape(name)}': {escape(str(e))}[/]")
+            return
+        if get_current_worker().is_cancelled:
+            return  # another `ledger` command took over
+        self.app.call_from_thread(self.app.switch_ledger, name, db, autocomplete)
+        self.app.call_from_thread(output.write, f"[green]✓ Switched to ledger '{escape(name)}'[/]")
+
+    def run_backup(self, output, force):
+        """Worker-thread body of the `backup` built-in"""
+        try:
+            result = self.app.backups.backup(force=force)
+        except Exception as e:
+            self.app.call_from_thread(output.write, f"[red]✗ Backup failed: {e}[/]")
+            return
+        if result is None:
+            message = "[yellow]No changes since the last backup (use backup --force)[/]"
+        else:
+            archives = f" and {result['archives']} archive file(s)" if result["archives"] else ""
+            message = (
+                f"[green]✓ Backed up to {result['path']}: "
+                f"{result['pages']} pages{archives} in {result['duration']:.2f}s[/]"
+            )
+        self.app.call_from_thread(output.write, message)
+
+    def run_range_command(self, args, output):
+        """Handle `range [<from> <to> | --days N | clear]` (dates inclusive)"""
+        if args == ["clear"]:
+            self.app.custom_range = None
+            self.app.render_range()
+            output.write("[dim]Custom range hidden[/]")
+            return
+        if len(args) == 2 and args[0] == "--days":
+            end = datetime.now().date()
+            start = end - timedelta(days=int(args[1]) - 1)
+        elif len(args) == 2:
+            start, end = (datetime.strptime(a, "%Y-%m-%d").date() for a in args)
+        elif not args and self.app.custom_range:
+            start, end = self.app.custom_range
+        else:
+            output.write("[red]Usage: range <YYYY-MM-DD> <YYYY-MM-DD> | range --days N | range clear[/]")
+            return
+        if end < start:
+            output.write("[red]The range ends before it starts[/]")
+            return
+
+        self.app.custom_range = (start, end)
+        self.app.render_range()
+        output.write(f"[bold]{start} → {end} ({(end - start).days + 1} days)[/]")
+        totals = {}
+        for kind in ("income", "expense"):
+            categories = self.app.db.get_range_totals(kind, start, end + timedelta(days=1))
+            color = "red" if kind == "expense" else "green"
+            for category, total in sorted(categories.items(), key=lambda item: -item[1]):
+                output.write(f"  [{color}]{kind:<8}[/] {escape(category):<14} ${total:,.2f}")
+            totals[kind] = sum(categories.values())
+        expenses, incomes = totals["expense"], totals["income"]
+        output.write(
+            f"[bold]Total - Incomes: ${incomes:,.2f}  Expenses: ${expenses:,.2f}  Balance: ${incomes - expenses:,.2f}[/]"
+        )
+
+    def run_report_command(self, args, output):
+        """Handle `report [ledger ...|all] [YYYY-MM]`"""
+        year = month = None
+        if args and re.match(r"^\d{4}-\d{2}$", args[-1]):
+            year, month = map(int, args.pop().split("-"))
+        ledgers = list_ledgers() if not args or args == ["all"] else args
+
+        rows = consolidated_report(ledgers, year, month)
+        period = f"{year}-{month:02d}" if year else "all time"
+        output.write(f"[bold]Consolidated report ({period}): {', '.join(ledgers)}[/]")
+        if not rows:
+            output.write("[yellow]No transactions found[/]")
+            return
+
+        totals = {}
+        for ledger, kind, category, total in rows:
+            color = "red" if kind == "expense" else "green"
+            output.write(f"  {escape(f'{ledger:<12}')} [{color}]{kind:<8}[/] {escape(f'{category:<14}')} ${total:,.2f}")
+            totals[kind] = totals.get(kind, 0) + total
+        expenses, incomes = totals.get("expense", 0), totals.get("income", 0)
+        output.write(
+            f"[bold]Total - Incomes: ${incomes:,.2f}  Expenses: ${expenses:,.2f}  Balance: ${incomes - expenses:,.2f}[/]"
+        )
+
     def generate_pie_charts(self, output):
         """Generate pie charts for expenses and incomes by category"""
         try:
@@ -593,6 +1100,8 @@ class BudgetApp(App):
         Binding("I", "edit_income", "Edit Income"),
         Binding("d", "delete_expense", "Delete Expense"),
         Binding("D", "delete_income", "Delete Income"),
+        Binding("u", "undo", "Undo"),
+        Binding("U", "redo", "Redo"),
         Binding("c", "open_command", "Command"),
         Binding("r", "refresh", "Refresh"),
         Binding("left", "prev_month", "Prev Month"),
@@ -602,6 +1111,7 @@ class BudgetApp(App):
     ]
 
     TITLE = "Budget Tracker TUI"
+    NAV_DEBOUNCE = 0.15  # seconds of quiet before a month change is queried
     CSS = """
     #visual-bars {
         height: 8;
@@ -625,11 +1135,36 @@ class BudgetApp(App):
     #balance-bar {
         color: $warning;
     }
+
+    #budget-bars {
+        height: auto;
+        max-height: 10;
+        padding: 0 1;
+        border: solid $warning;
+    }
+
+    #range-bars {
+        height: auto;
+        padding: 0 1;
+        border: solid $accent;
+    }
     """
 
-    def __init__(self):
+    def __init__(self, ledger=DEFAULT_LEDGER, backup_interval=None, busy_timeout=None):
         super().__init__()
-        self.db = Database()
+        self.ledger = ledger
+        self.busy_timeout = busy_timeout
+        self.db = Database(ledger_path(ledger), busy_timeout=busy_timeout)
+        self.load_autocomplete()
+        self.backup_interval = backup_interval
+        self.backups = BackupManager(self.db.db_path, archives=self.db.archive_paths)
+        self.nav_latencies = deque(maxlen=50)
+        # shell jobs started from the command screen: id -> command, start time, worker
+        self.jobs = {}
+        self.last_job = 0
+        self.custom_range = None  # (start, end) dates, inclusive
+        self._nav_started = 0.0
+        self.sub_title = f"Ledger: {ledger}"
         now = datetime.now()
         self.current_year = now.year
         self.current_month = now.month
@@ -653,6 +1188,14 @@ class BudgetApp(App):
                 yield Static("[bold cyan]Balance (Saldo):[/] $0.00", id="balance-bar", classes="bar-label")
                 yield Static("█" * 50, id="balance-visual")
 
+            # Category limits for the month, hidden while none are set
+            with Container(id="budget-bars"):
+                yield Static("", id="budget-status")
+
+            # Totals for the custom date range set with the `range` command
+            with Container(id="range-bars"):
+                yield Static("", id="range-status")
+
             with Container(id="summary-container"):
                 with Horizontal():
                     yield Static("Loading...", id="expense-summary")
@@ -671,6 +1214,24 @@ class BudgetApp(App):
 
     def on_mount(self) -> None:
         self.refresh_data()
+        self.start_periodic_backups()
+
+    def on_unmount(self) -> None:
+        self.backups.stop()
+
+    def start_periodic_backups(self) -> None:
+        """Back up the open ledger every `backup_interval` minutes, if configured"""
+        if not self.backup_interval:
+            return
+
+        def done(result):
+            self.call_from_thread(
+                self.notify,
+                f"Backup: {result['pages']} pages in {result['duration']:.2f}s",
+                severity="information",
+            )
+
+        self.backups.start_periodic(self.backup_interval * 60, on_done=done)
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         if event.button.id == "btn-prev":
@@ -699,7 +1260,27 @@ class BudgetApp(App):
         self.push_screen(DeleteIncomeScreen())
 
     def action_open_command(self) -> None:
-        self.push_screen(CommandScreen())
+        if not self.is_screen_installed("command"):
+            self.install_screen(CommandScreen(), "command")
+        self.push_screen("command")
+
+    def action_undo(self) -> None:
+        self._undo_redo(self.db.undo, "Undid")
+
+    def action_redo(self) -> None:
+        self._undo_redo(self.db.redo, "Redid")
+
+    def _undo_redo(self, step, verb) -> None:
+        try:
+            entry = step()
+        except ValueError as e:
+            self.notify(f"✗ {e}", severity="error")
+            return
+        if entry is None:
+            self.notify(f"Nothing to {verb[:-1].lower()}", severity="warning")
+            return
+        self.refresh_data()
+        self.notify(f"{verb} {entry.op} of {entry.kind} #{entry.row_id}")
 
     def action_refresh(self) -> None:
         self.refresh_data()
@@ -711,7 +1292,7 @@ class BudgetApp(App):
             self.current_year -= 1
         else:
             self.current_month -= 1
-        self.refresh_data()
+        self.navigate()
 
     def action_next_month(self) -> None:
         if self.current_month == 12:
@@ -719,15 +1300,91 @@ class BudgetApp(App):
             self.current_year += 1
         else:
             self.current_month += 1
-        self.refresh_data()
+        self.navigate()
 
     def action_current_month(self) -> None:
         now = datetime.now()
         self.current_year = now.year
         self.current_month = now.month
-        self.refresh_data()
+        self.navigate()
         self.notify("Showing current month")
 
+    # ─────────────────────────────
+    # Month navigation
+    # ─────────────────────────────
+    # The label follows every keypress at once; the data refresh runs in an
+    # exclusive worker that first waits NAV_DEBOUNCE, so each new press cancels
+    # the pending refresh. The queries run on a thread so the loop keeps taking
+    # keys; a query already running when it is cancelled still finishes there,
+    # and a result for a month or ledger no longer shown is dropped.
+    def navigate(self) -> None:
+        self._nav_started = time.perf_counter()
+        self.update_month_label(loading=True)
+        self.run_worker(
+            self.refresh_month(self.current_year, self.current_month),
+            group="month-refresh",
+            exclusive=True,
+        )
+
+    async def refresh_month(self, year, month) -> None:
+        await asyncio.sleep(self.NAV_DEBOUNCE)
+        db = self.db
+        try:
+            expenses, incomes, budget_status = await asyncio.to_thread(self.load_month, year, month, db)
+        except Exception as e:
+            self.notify(f"✗ Error refreshing data: {e}", severity="error")
+            return
+        if (year, month) != (self.current_year, self.current_month) or db is not self.db:
+            return
+        self.update_month_label()
+        self.render_month(expenses, incomes, budget_status)
+
+        latency = time.perf_counter() - self._nav_started
+        self.nav_latencies.append(latency)
+        self.log(f"Month navigation settled on {year}-{month:02d} in {latency * 1000:.1f} ms")
+
+    @property
+    def dashboard(self):
+        """The main screen; refreshes are often triggered while another screen is on top"""
+        return self.screen_stack[0]
+
+    def update_month_label(self, loading=False) -> None:
+        month_name = datetime(self.current_year, self.current_month, 1).strftime("%B %Y")
+        self.dashboard.query_one("#month-display", Static).update(f"[bold]{month_name}[/]" + (" [dim]…[/]" if loading else ""))
+
+    def switch_ledger(self, ledger, db, autocomplete) -> None:
+        """Close the current ledger and show another one, opened off the event loop by CommandScreen.open_ledger"""
+        self.db.close()
+        self.db = db
+        self.ledger = ledger
+        self.autocomplete = autocomplete
+        self.sub_title = f"Ledger: {ledger}"
+        self.backups.stop()
+        self.backups = BackupManager(db.db_path, archives=db.archive_paths)
+        self.start_periodic_backups()
+        self.refresh_data()
+
+    def load_autocomplete(self) -> None:
+        """(Re)build the description/category suggestion indexes from the open ledger"""
+        self.autocomplete = self.build_autocomplete(self.db)
+
+    @staticmethod
+    def build_autocomplete(db):
+        return {
+            "expense": Autocomplete.from_db(db, "expense", EXPENSE_CATEGORIES),
+            "income": Autocomplete.from_db(db, "income", INCOME_CATEGORIES),
+        }
+
+    def notify_budget(self, date, category) -> None:
+        """Warn when an expense pushes its category close to or over the monthly limit"""
+        status = self.db.check_budget(date, category)
+        if status is None:
+            return
+        if status["remaining"] < 0:
+            self.notify(f"{escape(category)} is over budget by ${-status['remaining']:,.2f}", severity="error")
+        elif status["spent"] >= 0.8 * status["limit"]:
+            self.notify(f"{escape(category)}: only ${status['remaining']:,.2f} left this month", severity="warning")
+
     def create_bar(self, value, max_value, width=50):
         """Create a visual bar representation"""
         if max_value == 0:
@@ -738,30 +1395,59 @@ class BudgetApp(App):
     def refresh_data(self) -> None:
         """Refresh dashboard data and update tables"""
         try:
-            month_name = datetime(self.current_year, self.current_month, 1).strftime("%B %Y")
-            self.query_one("#month-display", Static).update(f"[bold]{month_name}[/]")
-
-            monthly_expenses = self.db.get_monthly_expenses(self.current_year, self.current_month)
-            monthly_incomes = self.db.get_monthly_incomes(self.current_year, self.current_month)
-
-            # Sort by date (newest first)
-            monthly_expenses.sort(key=lambda x: x.date, reverse=True)
-            monthly_incomes.sort(key=lambda x: x.date, reverse=True)
+            self.update_month_label()
+            self.render_month(*self.load_month(self.current_year, self.current_month))
+            self.render_range()
+        except Exception as e:
+            self.notify(f"✗ Error refreshing data: {e}", severity="error")
 
+    def render_range(self) -> None:
+        """Show income, expenses and top categories of the custom range, if one is set"""
+        panel = self.dashboard.query_one("#range-bars", Container)
+        panel.display = self.custom_range is not None
+        if not panel.display:
+            return
+        start, end = self.custom_range
+        expenses = self.db.get_range_totals("expense", start, end + timedelta(days=1))
+        incomes = self.db.get_range_totals("income", start, end + timedelta(days=1))
+        total_expenses, total_incomes = sum(expenses.values()), sum(incomes.values())
+        balance = total_incomes - total_expenses
+        balance_color = "cyan" if balance >= 0 else "yellow"
+        top = sorted(expenses.items(), key=lambda item: -item[1])[:5]
+        self.dashboard.query_one("#range-status", Static).update(
+            f"[bold]{start} → {end}[/]  [green]Income ${total_incomes:,.2f}[/]  "
+            f"[red]Expenses ${total_expenses:,.2f}[/]  [{balance_color}]Balance ${balance:,.2f}[/]\n"
+            + "[dim]" + escape(", ".join(f"{category} ${total:,.2f}" for category, total in top)) + "[/]"
+        )
+
+    def load_month(self, year, month, db=None):
+        """Query everything the dashboard shows for one month (safe to call off the event loop)"""
+        db = db or self.db
+        monthly_expenses = db.get_monthly_expenses(year, month)
+        monthly_incomes = db.get_monthly_incomes(year, month)
+
+        # Sort by date (newest first)
+        monthly_expenses.sort(key=lambda x: x.date, reverse=True)
+        monthly_incomes.sort(key=lambda x: x.date, reverse=True)
+        return monthly_expenses, monthly_incomes, db.get_budget_status(year, month)
+
+    def render_month(self, monthly_expenses, monthly_incomes, budget_status) -> None:
+        """Update summary, bars and tables from load_month's results"""
+        try:
             total_expenses = sum(e.amount for e in monthly_expenses)
             total_incomes = sum(i.amount for i in monthly_incomes)
             balance = total_incomes - total_expenses
 
             # Update summary boxes
-            self.query_one("#expense-summary", Static).update(
+            self.dashboard.query_one("#expense-summary", Static).update(
                 f"[bold red]Expenses:[/]\n${total_expenses:,.2f}"
             )
-            self.query_one("#income-summary", Static).update(
+            self.dashboard.query_one("#income-summary", Static).update(
                 f"[bold green]Incomes:[/]\n${total_incomes:,.2f}"
             )
             
             balance_color = "green" if balance >= 0 else "red"
-            self.query_one("#balance-summary", Static).update(
+            self.dashboard.query_one("#balance-summary", Static).update(
                 f"[bold {balance_color}]Balance:[/]\n${balance:,.2f}"
             )
 
@@ -774,32 +1460,48 @@ class BudgetApp(App):
             # Balance bar - use absolute value for length, but color indicates positive/negative
             balance_bar = self.create_bar(abs(balance), max_value)
             
-            self.query_one("#income-bar", Static).update(
+            self.dashboard.query_one("#income-bar", Static).update(
                 f"[bold green]Income:[/] ${total_incomes:,.2f}"
             )
-            self.query_one("#income-visual", Static).update(
+            self.dashboard.query_one("#income-visual", Static).update(
                 f"[green]{income_bar}[/]"
             )
             
-            self.query_one("#expense-bar", Static).update(
+            self.dashboard.query_one("#expense-bar", Static).update(
                 f"[bold red]Expenses:[/] ${total_expenses:,.2f}"
             )
-            self.query_one("#expense-visual", Static).update(
+            self.dashboard.query_one("#expense-visual", Static).update(
                 f"[red]{expense_bar}[/]"
             )
             
             balance_color = "cyan" if balance >= 0 else "yellow"
             balance_symbol = "+" if balance >= 0 else ""
-            self.query_one("#balance-bar", Static).update(
+            self.dashboard.query_one("#balance-bar", Static).update(
                 f"[bold {balance_color}]Balance (Saldo):[/] {balance_symbol}${balance:,.2f}"
             )
-            self.query_one("#balance-visual", Static).update(
+            self.dashboard.query_one("#balance-visual", Static).update(
                 f"[{balance_color}]{balance_bar}[/{balance_color}]"
             )
 
+            # Update category limits
+            lines = []
+            for category, s in sorted(budget_status.items()):
+                if s["remaining"] < 0:
+                    color, note = "red", f"⚠ over by ${-s['remaining']:,.2f}"
+                elif s["spent"] >= 0.8 * s["limit"]:
+                    color, note = "yellow", f"${s['remaining']:,.2f} left"
+                else:
+                    color, note = "green", f"${s['remaining']:,.2f} left"
+                bar = self.create_bar(min(s["spent"], s["limit"]), s["limit"], width=30)
+                lines.append(
+                    f"[bold]{escape(f'{category:<14}')}[/] [{color}]{bar}[/] ${s['spent']:,.2f} / ${s['limit']:,.2f}  [{color}]{note}[/]"
+                )
+            self.dashboard.query_one("#budget-status", Static).update("\n".join(lines))
+            self.dashboard.query_one("#budget-bars", Container).display = bool(lines)
+
             # Update tables with dynamic heights
-            exp_table = self.query_one("#expense-table", DataTable)
-            inc_table = self.query_one("#income-table", DataTable)
+            exp_table = self.dashboard.query_one("#expense-table", DataTable)
+            inc_table = self.dashboard.query_one("#income-table", DataTable)
 
             exp_table.clear(columns=True)
             inc_table.clear(columns=True)